@@ -0,0 +1,6 @@
+from typing import Annotated
+from fastapi import Depends
+from app.api.v1.endpoints.auth import get_current_user
+
+# 인증된 사용자 의존성
+CurrentUser = Annotated[dict, Depends(get_current_user)]
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from app.core.security import create_access_token, verify_token
 from datetime import timedelta
 from app.core.config import settings
@@ -8,8 +8,12 @@ from app.core.config import settings
 router = APIRouter()
 security = HTTPBearer()
 
+_ACCESS_TOKEN_TTL = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
 
 class LoginRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
     username: str
     password: str
 
@@ -24,9 +28,8 @@ async def login(request: LoginRequest):
     """로그인 (MVP용 간단한 인증)"""
     # MVP에서는 간단한 하드코딩된 사용자 인증
     if request.username == "admin" and request.password == "password":
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": request.username}, expires_delta=access_token_expires
+            data={"sub": request.username}, expires_delta=_ACCESS_TOKEN_TTL
         )
         return LoginResponse(access_token=access_token, token_type="bearer")
     else:
@@ -1,42 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from app.api.v1.endpoints.auth import get_current_user
-from app.services.text_to_sql import text_to_sql_engine
-from app.services.rag_engine import rag_engine
-from app.services.langgraph_agent import langgraph_agent
-from app.services.langchain_rag import langchain_rag_engine
-from app.services.langchain_sql import langchain_sql_engine
-from app.services.langserve_server import langserve_server
+import asyncio
+import importlib
+from functools import lru_cache
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import AsyncIterator, Optional
+import orjson
+from app.api.v1.deps import CurrentUser
+from app.core.cache import get_cached_json, set_cached_json
+from app.core.config import settings
 
 router = APIRouter()
 
+# 엔진 이름 -> 모듈 경로 (무거운 LangChain 모듈은 첫 사용 시 로딩)
+_ENGINE_MODULES = {
+    "text_to_sql_engine": "app.services.text_to_sql",
+    "rag_engine": "app.services.rag_engine",
+    "db_introspection": "app.services.database_introspection",
+}
+
+# 인스턴스 대신 팩토리 함수를 제공하는 엔진
+_ENGINE_FACTORIES = {
+    "langchain_rag_engine": ("app.services.langchain_rag", "get_rag_engine"),
+    "langchain_sql_engine": ("app.services.langchain_sql", "get_sql_engine"),
+    "langgraph_agent": ("app.services.langgraph_agent", "get_agent"),
+    "langserve_server": ("app.services.langserve_server", "get_langserve_server"),
+}
+
+# 히스토리 기능 구현 전 고정 응답 (사용자별 캐시 불필요)
+_HISTORY_PLACEHOLDER = {"history": [], "message": "질의 히스토리 기능은 향후 구현 예정입니다."}
+
+
+@lru_cache(maxsize=None)
+def _get_engine(name: str):
+    """서비스 엔진 지연 로딩"""
+    if name in _ENGINE_FACTORIES:
+        module_name, factory_name = _ENGINE_FACTORIES[name]
+        return getattr(importlib.import_module(module_name), factory_name)()
+    module = importlib.import_module(_ENGINE_MODULES[name])
+    return getattr(module, name)
+
 
 class QueryRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
     question: str
     context: Optional[str] = None
     method: Optional[str] = "langgraph"  # langgraph, langchain, original
+    debug: bool = False  # 단계별 상세 처리 내용 포함 여부
 
 
 class QueryResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
     success: bool
     question: str
     answer: str
     sql_query: Optional[str] = None
-    data: Optional[List[Dict[str, Any]]] = None
-    columns: Optional[List[str]] = None
+    data: Optional[list[dict]] = None
+    columns: Optional[list[str]] = None
     row_count: Optional[int] = None
     explanation: Optional[str] = None
     confidence: Optional[float] = None
     error: Optional[str] = None
     method: Optional[str] = None
-    intermediate_steps: Optional[List[Dict[str, Any]]] = None
+    intermediate_steps: Optional[list[dict]] = None
 
 
-@router.post("/ask", response_model=QueryResponse)
+# 응답은 엔진 결과로 검증 없이 구성하므로 response_model 대신 문서용 스키마만 지정 (재검증 생략)
+@router.post("/ask", responses={200: {"model": QueryResponse}})
 async def ask_question(
     request: QueryRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """자연어 질의 처리 (다중 엔진 지원)"""
     try:
@@ -44,13 +79,13 @@ async def ask_question(
         
         if method == "langgraph":
             # LangGraph 에이전트 사용
-            result = await langgraph_agent.process_question(request.question)
+            result = await _get_engine("langgraph_agent").process_question(request.question, request.debug)
             
             answer = result["answer"]
             if not result["success"] and result.get("error"):
                 answer += f"\n오류: {result['error']}"
             
-            return QueryResponse(
+            return QueryResponse.model_construct(
                 success=result["success"],
                 question=result["question"],
                 answer=answer,
@@ -67,12 +102,12 @@ async def ask_question(
             
         elif method == "langchain":
             # LangChain SQL 엔진 사용
-            result = await langchain_sql_engine.process_question_advanced(
+            result = await _get_engine("langchain_sql_engine").process_question_advanced(
                 question=request.question,
                 method="chain"
             )
             
-            return QueryResponse(
+            return QueryResponse.model_construct(
                 success=result["success"],
                 question=result["question"],
                 answer=result["answer"],
@@ -88,7 +123,7 @@ async def ask_question(
             
         else:  # original
             # 기존 Text-to-SQL 엔진 사용
-            result = await text_to_sql_engine.process_question(
+            result = await _get_engine("text_to_sql_engine").process_question(
                 question=request.question,
                 user_context=request.context
             )
@@ -107,7 +142,7 @@ async def ask_question(
                 if result.get("error"):
                     answer += f"\n오류: {result['error']}"
             
-            return QueryResponse(
+            return QueryResponse.model_construct(
                 success=result["success"],
                 question=result["question"],
                 answer=answer,
@@ -124,45 +159,89 @@ async def ask_question(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: QueryRequest,
+    current_user: CurrentUser
+):
+    """LangChain RAG 답변 스트리밍 (Server-Sent Events)"""
+    rag_engine = _get_engine("langchain_rag_engine")
+    
+    async def event_stream() -> AsyncIterator[bytes]:
+        try:
+            async for token in rag_engine.ask_question_stream(request.question):
+                yield b"data: " + orjson.dumps({"token": token}) + b"\n\n"
+            yield b"event: end\ndata: {}\n\n"
+        except Exception as e:
+            yield b"event: error\ndata: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.get("/history")
-async def get_query_history(current_user: dict = Depends(get_current_user)):
+async def get_query_history(current_user: CurrentUser):
     """질의 히스토리 조회"""
-    return {"history": [], "message": "질의 히스토리 기능은 향후 구현 예정입니다."}
+    return _HISTORY_PLACEHOLDER
 
 
 @router.post("/initialize")
-async def initialize_knowledge_base(current_user: dict = Depends(get_current_user)):
+async def initialize_knowledge_base(current_user: CurrentUser):
     """지식 베이스 초기화 (LangChain RAG 포함)"""
     try:
-        # 기존 RAG 엔진 초기화
-        await rag_engine.initialize_knowledge_base()
+        # 최신 스키마를 반영하도록 인트로스펙션 캐시와 이전 스키마 기준 SQL/답변 캐시 초기화
+        _get_engine("db_introspection").invalidate()
+        await asyncio.to_thread(_get_engine("text_to_sql_engine").clear_cache)
+        agent = _get_engine("langgraph_agent")
+        agent.invalidate_schema_cache()
+        agent.answer_cache.clear()
+        
+        # 기존 RAG 엔진과 LangChain RAG 엔진 동시 초기화
+        engine_names = ["rag_engine", "langchain_rag_engine"]
+        results = await asyncio.gather(
+            *(_get_engine(name).initialize_knowledge_base() for name in engine_names),
+            return_exceptions=True
+        )
         
-        # LangChain RAG 엔진 초기화
-        await langchain_rag_engine.initialize_knowledge_base()
+        failures = {
+            name: str(result)
+            for name, result in zip(engine_names, results)
+            if isinstance(result, Exception)
+        }
+        if failures:
+            raise HTTPException(
+                status_code=500,
+                detail={"message": "일부 지식 베이스 초기화에 실패했습니다.", "failures": failures}
+            )
         
         return {"message": "모든 지식 베이스가 성공적으로 초기화되었습니다."}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/stats")
-async def get_stats(current_user: dict = Depends(get_current_user)):
+async def get_stats(current_user: CurrentUser):
     """벡터 DB 통계 조회"""
     try:
-        # 기존 RAG 엔진 통계
-        original_stats = await rag_engine.get_collection_stats()
-        
-        # LangChain RAG 엔진 통계
-        langchain_stats = await langchain_rag_engine.get_stats()
+        cached = await get_cached_json("stats:v1")
+        if cached is not None:
+            return cached
         
-        # LangChain SQL 엔진 통계
-        sql_stats = await langchain_sql_engine.get_stats()
+        # 기존 RAG / LangChain RAG / LangChain SQL 엔진 통계 동시 조회
+        original_stats, langchain_stats, sql_stats = await asyncio.gather(
+            _get_engine("rag_engine").get_collection_stats(),
+            _get_engine("langchain_rag_engine").get_stats(),
+            _get_engine("langchain_sql_engine").get_stats()
+        )
         
-        return {
+        payload = {
             "original_rag": original_stats,
             "langchain_rag": langchain_stats,
             "langchain_sql": sql_stats
         }
+        await set_cached_json("stats:v1", payload, settings.STATS_CACHE_TTL)
+        return payload
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -170,11 +249,11 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
 @router.post("/langserve/agent")
 async def langserve_agent_invoke(
     request: QueryRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """LangServe 에이전트 직접 호출"""
     try:
-        result = await langserve_server.invoke_agent(request.question, request.context)
+        result = await _get_engine("langserve_server").invoke_agent(request.question, request.context)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -183,11 +262,11 @@ async def langserve_agent_invoke(
 @router.post("/langserve/rag")
 async def langserve_rag_invoke(
     request: QueryRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """LangServe RAG 직접 호출"""
     try:
-        result = await langserve_server.invoke_rag(request.question)
+        result = await _get_engine("langserve_server").invoke_rag(request.question)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -196,11 +275,11 @@ async def langserve_rag_invoke(
 @router.post("/langserve/sql")
 async def langserve_sql_invoke(
     request: QueryRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """LangServe SQL 직접 호출"""
     try:
-        result = await langserve_server.invoke_sql(request.question, request.method or "manual")
+        result = await _get_engine("langserve_server").invoke_sql(request.question, request.method or "manual")
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
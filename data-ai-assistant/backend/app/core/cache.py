@@ -0,0 +1,27 @@
+from typing import Any, Optional
+import orjson
+import redis.asyncio as aioredis
+from .config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+redis_client = aioredis.from_url(settings.REDIS_URL)
+
+
+async def get_cached_json(key: str) -> Optional[Any]:
+    """Redis에서 캐시된 JSON 응답 조회 (Redis 오류 시 캐시 미스로 처리)"""
+    try:
+        cached = await redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Redis get failed for {key}: {str(e)}")
+        return None
+    return orjson.loads(cached) if cached is not None else None
+
+
+async def set_cached_json(key: str, value: Any, ttl: int):
+    """JSON 응답을 Redis에 TTL과 함께 저장"""
+    try:
+        await redis_client.set(key, orjson.dumps(value), ex=ttl)
+    except Exception as e:
+        logger.warning(f"Redis set failed for {key}: {str(e)}")
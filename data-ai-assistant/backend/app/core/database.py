@@ -1,18 +1,35 @@
+from typing import AsyncGenerator
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 워커 프로세스마다 엔진별 풀이 생기므로 워커 수로 나눈 크기 사용 (Postgres max_connections 초과 방지)
+_POOL_OPTIONS = dict(
+    pool_size=settings.DB_WORKER_POOL_SIZE,
+    max_overflow=settings.DB_WORKER_MAX_OVERFLOW,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE
+)
+
+engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    connect_args={"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}},
+    **_POOL_OPTIONS
+)
+
+# 동기 API(SQLDatabase, 리플렉션 등)만 지원하는 서비스들이 함께 사용하는 엔진
+sync_engine = create_engine(
+    settings.DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"},
+    **_POOL_OPTIONS
+)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """데이터베이스 세션 의존성"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
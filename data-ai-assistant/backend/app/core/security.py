@@ -1,38 +1,71 @@
+import asyncio
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
+from cachetools import TTLCache
+import jwt
+from jwt import PyJWTError
 from passlib.context import CryptContext
 from .config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_DEFAULT_TOKEN_TTL = timedelta(minutes=15)
+_JWT_SECRET_KEY = settings.JWT_SECRET_KEY
+_JWT_ALGORITHM = settings.JWT_ALGORITHM
+_JWT_ALGORITHMS = [_JWT_ALGORITHM]
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """비밀번호 검증"""
-    return pwd_context.verify(plain_password, hashed_password)
+# 검증된 JWT 페이로드 캐시 (원본 토큰 대신 해시를 키로 사용)
+_payload_cache = TTLCache(maxsize=settings.JWT_CACHE_MAXSIZE, ttl=settings.JWT_CACHE_TTL)
+_payload_cache_lock = threading.Lock()
 
 
-def get_password_hash(password: str) -> str:
-    """비밀번호 해시"""
-    return pwd_context.hash(password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """비밀번호 검증 (bcrypt 연산은 스레드 풀에서 실행)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
+    """비밀번호 해시 (bcrypt 연산은 스레드 풀에서 실행)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """JWT 토큰 생성"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    to_encode = {**data, "exp": datetime.utcnow() + (expires_delta or _DEFAULT_TOKEN_TTL)}
+    encoded_jwt = jwt.encode(to_encode, _JWT_SECRET_KEY, algorithm=_JWT_ALGORITHM)
     return encoded_jwt
 
 
+def _token_cache_key(token: str) -> bytes:
+    """토큰 캐시 키 생성"""
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+
 def verify_token(token: str):
     """JWT 토큰 검증"""
+    cache_key = _token_cache_key(token)
+    
+    with _payload_cache_lock:
+        payload = _payload_cache.get(cache_key)
+    
+    if payload is not None:
+        # TTL 내에 토큰이 만료된 경우 캐시를 사용하지 않음
+        if payload.get("exp", 0) > time.time():
+            return payload
+        with _payload_cache_lock:
+            _payload_cache.pop(cache_key, None)
+        return None
+    
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return payload
-    except JWTError:
-        return None
\ No newline at end of file
+        payload = jwt.decode(token, _JWT_SECRET_KEY, algorithms=_JWT_ALGORITHMS)
+    except PyJWTError:
+        return None
+    
+    with _payload_cache_lock:
+        _payload_cache[cache_key] = payload
+    return payload
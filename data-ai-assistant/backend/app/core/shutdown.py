@@ -0,0 +1,26 @@
+import asyncio
+from typing import Awaitable, Callable, List, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 앱 종료 시 실행할 정리 함수 (모듈 로드 시 등록되므로 사용하지 않은 엔진은 건너뜀)
+_shutdown_hooks: List[Callable[[], Union[None, Awaitable[None]]]] = []
+
+
+def register_shutdown_hook(hook: Callable[[], Union[None, Awaitable[None]]]):
+    """앱 종료 시 실행할 정리 함수 등록 (동기 함수는 스레드에서 실행)"""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+async def run_shutdown_hooks():
+    """등록된 정리 함수 실행 (하나가 실패해도 나머지는 계속 실행)"""
+    for hook in _shutdown_hooks:
+        try:
+            if asyncio.iscoroutinefunction(hook):
+                await hook()
+            else:
+                await asyncio.to_thread(hook)
+        except Exception as e:
+            logger.error(f"Error running shutdown hook {getattr(hook, '__qualname__', hook)}: {str(e)}")
@@ -1,13 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
+from app.core.shutdown import run_shutdown_hooks
 from app.api.v1.router import api_router
-from app.services.langserve_server import langserve_server
+
+# 프로덕션에서는 OpenAPI 스키마와 문서 페이지 비활성화
+is_production = settings.ENVIRONMENT == "production"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """앱 시작 시 무거운 엔진을 미리 생성 (실패하면 기동 중단, /query/ask도 같은 엔진을 사용하므로 항상 실행)"""
+    from app.services.langgraph_agent import get_agent
+    from app.services.langchain_rag import get_rag_engine
+    from app.services.langchain_sql import get_sql_engine
+    
+    # 스키마 리플렉션과 벡터 스토어 로딩이 서로 겹치도록 동시에 초기화
+    await asyncio.gather(
+        asyncio.to_thread(get_agent),
+        asyncio.to_thread(get_rag_engine),
+        asyncio.to_thread(get_sql_engine)
+    )
+    yield
+    
+    # 종료 시 로드된 엔진이 등록한 정리 작업 실행 (SQL 캐시 저장 등)
+    await run_shutdown_hooks()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=None if is_production else f"{settings.API_V1_STR}/openapi.json",
+    docs_url=None if is_production else "/docs",
+    redoc_url=None if is_production else "/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS 설정
@@ -15,18 +45,18 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # React 개발 서버
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # 프리플라이트 응답 24시간 캐시
 )
 
 # API 라우터 등록
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
-# LangServe 라우트 추가
-try:
-    langserve_server.add_routes_to_app(app)
-except Exception as e:
-    print(f"Warning: Could not add LangServe routes: {e}")
+# LangServe 라우트 추가 (활성화된 경우에만 LangChain 모듈 로딩)
+if settings.ENABLE_LANGSERVE:
+    from app.services.langserve_server import get_langserve_server
+    get_langserve_server().add_routes_to_app(app)
 
 
 @app.get("/")
@@ -36,4 +66,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": settings.VERSION}
\ No newline at end of file
+    return {"status": "healthy", "version": settings.VERSION}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # uvloop 이벤트 루프와 httptools HTTP 파서 사용 (워커 수는 DB 풀 분배와 같은 설정값 사용)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.WEB_CONCURRENCY
+    )
\ No newline at end of file
@@ -1,25 +1,123 @@
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools.func import ttl_cache
 from typing import List, Dict, Any
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import MetaData, Table, bindparam, inspect, select, text
 from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_db, sync_engine
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 테이블별 DDL 변경 식별값 (ALTER 등으로 pg_class 행이 갱신되면 xmin이 바뀜, 시스템 테이블 제외)
+_TABLE_FINGERPRINT_QUERY = text(r"""
+    SELECT c.relname, c.xmin::text
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema()
+      AND c.relkind IN ('r', 'p')
+      AND c.relname NOT LIKE 'pg\_%'
+    ORDER BY c.relname
+""")
+
 
 class DatabaseIntrospection:
     """데이터베이스 메타데이터 수집 클래스"""
     
     def __init__(self):
-        self.engine = create_engine(settings.DATABASE_URL)
+        self.engine = sync_engine
         self.inspector = inspect(self.engine)
+        self.metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        # 여러 스레드에서 동시에 호출될 수 있으므로 MetaData 리플렉션 보호
+        self._reflect_lock = threading.Lock()
+    
+    def _get_table(self, table_name: str) -> Table:
+        """리플렉션된 Table 객체 조회 (테이블별 캐시)"""
+        table = self._tables.get(table_name)
+        if table is None:
+            with self._reflect_lock:
+                table = self._tables.get(table_name)
+                if table is None:
+                    table = Table(table_name, self.metadata, autoload_with=self.engine)
+                    self._tables[table_name] = table
+        return table
     
     def get_all_tables(self) -> List[str]:
         """모든 테이블 이름 조회"""
         return self.inspector.get_table_names()
     
+    def get_table_fingerprints(self) -> Dict[str, str]:
+        """테이블별 DDL 식별값 조회 (단일 쿼리)"""
+        with self.engine.connect() as conn:
+            return {name: fingerprint for name, fingerprint in conn.execute(_TABLE_FINGERPRINT_QUERY)}
+    
+    def _load_description_cache(self) -> Dict[str, Dict[str, Any]]:
+        """디스크에 저장된 테이블 설명 캐시 로드"""
+        try:
+            with open(settings.SCHEMA_DESCRIPTION_CACHE_PATH, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_description_cache(self, descriptions: Dict[str, Dict[str, Any]]):
+        """테이블 설명 캐시를 디스크에 저장"""
+        path = settings.SCHEMA_DESCRIPTION_CACHE_PATH
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(descriptions, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"Error saving schema description cache: {str(e)}")
+    
+    def _describe_table(self, table_name: str) -> Dict[str, Any]:
+        """테이블 하나의 설명과 스키마 요약 생성"""
+        schema = self.get_table_schema(table_name)
+        return {
+            "description": self._build_table_description(table_name),
+            "column_count": len(schema["columns"]),
+            "has_foreign_keys": len(schema["foreign_keys"]) > 0
+        }
+    
+    def describe_tables(self) -> Dict[str, Dict[str, Any]]:
+        """전체 테이블 설명 조회 (DDL이 바뀐 테이블만 다시 인트로스펙션)"""
+        cached = self._load_description_cache()
+        fingerprints = self.get_table_fingerprints()
+        stale = [
+            table_name for table_name, fingerprint in fingerprints.items()
+            if cached.get(table_name, {}).get("fingerprint") != fingerprint
+        ]
+        
+        # 바뀐 테이블은 커넥션 풀 크기 안에서 동시에 인트로스펙션
+        refreshed = {}
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(len(stale), settings.DB_WORKER_POOL_SIZE)) as executor:
+                refreshed = dict(zip(stale, executor.map(self._describe_table, stale)))
+        
+        descriptions = {}
+        for table_name, fingerprint in fingerprints.items():
+            entry = refreshed.get(table_name) or cached[table_name]
+            descriptions[table_name] = {**entry, "fingerprint": fingerprint}
+        
+        if descriptions != cached:
+            self._save_description_cache(descriptions)
+        
+        return descriptions
+    
+    def invalidate(self):
+        """인트로스펙션 캐시 초기화"""
+        self.get_table_schema.cache_clear()
+        self._fetch_sample_data.cache_clear()
+        self._build_table_description.cache_clear()
+        self.inspector = inspect(self.engine)
+        self.metadata = MetaData()
+        self._tables = {}
+        logger.info("Database introspection cache cleared")
+    
+    @ttl_cache(maxsize=256, ttl=settings.INTROSPECTION_CACHE_TTL)
     def get_table_schema(self, table_name: str) -> Dict[str, Any]:
         """테이블 스키마 정보 조회"""
         try:
@@ -64,52 +162,58 @@ class DatabaseIntrospection:
             logger.error(f"Error getting schema for table {table_name}: {str(e)}")
             raise
     
+    @ttl_cache(maxsize=256, ttl=settings.INTROSPECTION_CACHE_TTL)
+    def _fetch_sample_data(self, table_name: str, limit: int) -> List[Dict[str, Any]]:
+        """테이블 샘플 데이터 조회 (성공한 결과만 캐시되도록 오류는 그대로 전파)"""
+        stmt = select(self._get_table(table_name)).limit(bindparam("limit"))
+        with self.engine.connect() as conn:
+            result = conn.execute(stmt, {"limit": limit})
+            return [dict(row) for row in result.mappings()]
+    
     def get_sample_data(self, table_name: str, limit: int = 5) -> List[Dict[str, Any]]:
         """테이블 샘플 데이터 조회"""
         try:
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    text(f"SELECT * FROM {table_name} LIMIT {limit}")
-                )
-                columns = result.keys()
-                rows = result.fetchall()
-                
-                return [
-                    {col: str(row[i]) for i, col in enumerate(columns)}
-                    for row in rows
-                ]
+            return self._fetch_sample_data(table_name, limit)
         except Exception as e:
             logger.error(f"Error getting sample data for table {table_name}: {str(e)}")
             return []
     
+    @ttl_cache(maxsize=256, ttl=settings.INTROSPECTION_CACHE_TTL)
+    def _build_table_description(self, table_name: str) -> str:
+        """테이블 설명 생성 (스키마 조회 오류는 캐시되지 않도록 그대로 전파)"""
+        schema = self.get_table_schema(table_name)
+        # 샘플 데이터를 읽지 못해도 컬럼/외래 키 설명은 유지 (샘플 섹션만 생략)
+        sample_data = self.get_sample_data(table_name, 3)
+        
+        description = f"Table: {table_name}\n\n"
+        description += "Columns:\n"
+        
+        for col in schema["columns"]:
+            description += f"- {col['name']} ({col['type']})"
+            if col["primary_key"]:
+                description += " [Primary Key]"
+            if not col["nullable"]:
+                description += " [Not Null]"
+            description += "\n"
+        
+        if schema["foreign_keys"]:
+            description += "\nForeign Keys:\n"
+            for fk in schema["foreign_keys"]:
+                description += f"- {fk['column']} -> {fk['referenced_table']}.{fk['referenced_column']}\n"
+        
+        if sample_data:
+            description += f"\nSample Data (first 3 rows):\n"
+            for i, row in enumerate(sample_data, 1):
+                # 문서 텍스트가 Decimal(...) 등 repr 형태가 되지 않도록 값만 문자열로 표시
+                row_text = {col: str(value) for col, value in row.items()}
+                description += f"Row {i}: {row_text}\n"
+        
+        return description
+    
     def generate_table_description(self, table_name: str) -> str:
         """테이블 설명 생성"""
         try:
-            schema = self.get_table_schema(table_name)
-            sample_data = self.get_sample_data(table_name, 3)
-            
-            description = f"Table: {table_name}\n\n"
-            description += "Columns:\n"
-            
-            for col in schema["columns"]:
-                description += f"- {col['name']} ({col['type']})"
-                if col["primary_key"]:
-                    description += " [Primary Key]"
-                if not col["nullable"]:
-                    description += " [Not Null]"
-                description += "\n"
-            
-            if schema["foreign_keys"]:
-                description += "\nForeign Keys:\n"
-                for fk in schema["foreign_keys"]:
-                    description += f"- {fk['column']} -> {fk['referenced_table']}.{fk['referenced_column']}\n"
-            
-            if sample_data:
-                description += f"\nSample Data (first 3 rows):\n"
-                for i, row in enumerate(sample_data, 1):
-                    description += f"Row {i}: {row}\n"
-            
-            return description
+            return self._build_table_description(table_name)
         except Exception as e:
             logger.error(f"Error generating description for table {table_name}: {str(e)}")
             return f"Table: {table_name} (Error loading details)"
@@ -174,16 +278,12 @@ class DatabaseIntrospection:
         
         try:
             with self.engine.connect() as conn:
-                # 테이블 생성
-                for table_sql in sample_tables:
-                    conn.execute(text(table_sql))
-                
-                # 샘플 데이터 삽입
-                for data_sql in sample_data:
-                    conn.execute(text(data_sql))
-                
+                # 테이블 생성 및 샘플 데이터 삽입을 하나의 스크립트로 전송 (단일 왕복)
+                conn.exec_driver_sql("\n".join(sample_tables + sample_data))
                 conn.commit()
                 logger.info("Sample tables and data created successfully")
+            
+            self.invalidate()
         except Exception as e:
             logger.error(f"Error creating sample tables: {str(e)}")
             raise
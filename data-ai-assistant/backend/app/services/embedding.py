@@ -1,6 +1,10 @@
-import openai
+import hashlib
+import threading
+from cachetools import LRUCache
 from typing import List, Dict, Any
 from app.core.config import settings
+from app.services.llm_client import async_openai_client
+from app.services.micro_batcher import MicroBatcher
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,17 +14,47 @@ class EmbeddingService:
     """임베딩 서비스 클래스"""
     
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = async_openai_client
         self.model = "text-embedding-ada-002"
+        
+        # 단일 텍스트 요청을 모아 한 번의 API 호출로 처리
+        self._batcher = MicroBatcher(
+            self._create_embeddings,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_batch_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000,
+            name="batched embeddings"
+        )
+        
+        # 동일 텍스트 임베딩 캐시 (내용 해시 기준, 여러 루프 스레드에서 공유)
+        self._cache: LRUCache = LRUCache(maxsize=settings.EMBEDDING_CACHE_SIZE)
+        self._cache_lock = threading.Lock()
+    
+    @staticmethod
+    def _cache_key(text: str) -> bytes:
+        """임베딩 캐시 키 생성"""
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    async def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """OpenAI 임베딩 API 호출"""
+        response = await self.client.embeddings.create(
+            model=self.model,
+            input=texts
+        )
+        return [data.embedding for data in response.data]
     
     async def embed_text(self, text: str) -> List[float]:
         """텍스트를 벡터로 변환"""
+        cache_key = self._cache_key(text)
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=text
-            )
-            return response.data[0].embedding
+            embedding = await self._batcher.submit(text)
+            with self._cache_lock:
+                self._cache[cache_key] = embedding
+            return embedding
         except Exception as e:
             logger.error(f"Error creating embedding: {str(e)}")
             raise
@@ -28,11 +62,7 @@ class EmbeddingService:
     async def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """여러 텍스트를 벡터로 변환"""
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=texts
-            )
-            return [data.embedding for data in response.data]
+            return await self._create_embeddings(texts)
         except Exception as e:
             logger.error(f"Error creating embeddings: {str(e)}")
             raise
@@ -54,4 +84,4 @@ class EmbeddingService:
 
 
 # 전역 임베딩 서비스 인스턴스
-embedding_service = EmbeddingService()
\ No newline at end of file
+embedding_service = EmbeddingService()
@@ -1,45 +1,247 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
+from functools import lru_cache
 from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
+from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from langchain.schema import AIMessage, Document, get_buffer_string
+from langchain.schema.embeddings import Embeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationTokenBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 from app.core.config import settings
+from cachetools import TTLCache
 from app.services.database_introspection import db_introspection
+from app.services.embedding import embedding_service
+from app.services.llm_client import get_chat_model
+import asyncio
+import hashlib
+import json
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
 
+# 지식 베이스 시드 데이터 (변경되지 않으므로 문서를 import 시 한 번만 생성)
+_BUSINESS_TERMS = (
+    {
+        "term": "고객",
+        "definition": "제품이나 서비스를 구매하는 개인 또는 기업",
+        "category": "business",
+        "examples": "customers 테이블의 데이터",
+        "related_tables": ["customers", "orders"]
+    },
+    {
+        "term": "주문",
+        "definition": "고객이 제품을 구매하는 거래",
+        "category": "business",
+        "examples": "orders 테이블의 데이터",
+        "related_tables": ["orders", "customers", "products"]
+    },
+    {
+        "term": "제품",
+        "definition": "판매되는 상품이나 서비스",
+        "category": "business",
+        "examples": "products 테이블의 데이터",
+        "related_tables": ["products", "orders"]
+    },
+    {
+        "term": "매출",
+        "definition": "판매로 인한 수익 금액",
+        "category": "finance",
+        "examples": "orders 테이블의 total_amount 컬럼",
+        "related_tables": ["orders"]
+    },
+    {
+        "term": "재고",
+        "definition": "판매 가능한 제품의 수량",
+        "category": "inventory",
+        "examples": "products 테이블의 stock_quantity 컬럼",
+        "related_tables": ["products"]
+    }
+)
+
+_SQL_EXAMPLES = (
+    {
+        "question": "모든 고객 목록을 보여주세요",
+        "sql": "SELECT id, name, email, phone, created_at FROM customers ORDER BY created_at DESC;",
+        "explanation": "customers 테이블의 모든 레코드를 최신 순으로 조회합니다.",
+        "complexity": "simple",
+        "keywords": ["고객", "목록", "전체", "모든"]
+    },
+    {
+        "question": "총 주문 금액이 가장 높은 고객을 찾아주세요",
+        "sql": """SELECT c.id, c.name, SUM(o.total_amount) as total_spent 
+                 FROM customers c 
+                 JOIN orders o ON c.id = o.customer_id 
+                 GROUP BY c.id, c.name 
+                 ORDER BY total_spent DESC 
+                 LIMIT 1;""",
+        "explanation": "고객별 총 주문 금액을 계산하여 가장 많이 구매한 고객을 조회합니다.",
+        "complexity": "medium",
+        "keywords": ["총", "주문", "금액", "높은", "고객", "최고"]
+    },
+    {
+        "question": "카테고리별 제품 수량을 보여주세요",
+        "sql": "SELECT category, COUNT(*) as product_count FROM products GROUP BY category ORDER BY product_count DESC;",
+        "explanation": "제품을 카테고리별로 그룹화하여 각 카테고리의 제품 수를 조회합니다.",
+        "complexity": "simple",
+        "keywords": ["카테고리", "제품", "수량", "개수"]
+    },
+    {
+        "question": "재고가 부족한 제품을 찾아주세요",
+        "sql": "SELECT id, name, stock_quantity, category FROM products WHERE stock_quantity < 10 ORDER BY stock_quantity ASC;",
+        "explanation": "재고가 10개 미만인 제품들을 재고 수량 순으로 조회합니다.",
+        "complexity": "simple",
+        "keywords": ["재고", "부족", "제품", "적은"]
+    },
+    {
+        "question": "최근 한 달간 주문 현황을 보여주세요",
+        "sql": """SELECT DATE(order_date) as order_day, 
+                 COUNT(*) as order_count,
+                 SUM(total_amount) as daily_revenue
+                 FROM orders 
+                 WHERE order_date >= CURRENT_DATE - INTERVAL '30 days'
+                 GROUP BY DATE(order_date)
+                 ORDER BY order_day DESC;""",
+        "explanation": "최근 30일간의 일별 주문 건수와 매출을 조회합니다.",
+        "complexity": "medium",
+        "keywords": ["최근", "한 달", "주문", "현황", "매출"]
+    }
+)
+
+_QA_SYSTEM_PROMPT = """당신은 데이터베이스 전문가입니다. 주어진 컨텍스트와 대화 기록을 바탕으로 사용자의 질문에 답변하세요.
+
+답변할 때 다음 사항을 고려하세요:
+1. 테이블 스키마 정보를 정확히 활용하세요
+2. 비즈니스 용어를 올바르게 해석하세요
+3. 적절한 SQL 쿼리를 제안하세요
+4. 안전한 SELECT 문만 사용하세요
+5. 명확하고 구체적으로 답변하세요"""
+
+# 고정 지시문을 맨 앞 system 메시지로 두어 요청 간 프롬프트 prefix가 동일하도록 구성
+_QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _QA_SYSTEM_PROMPT),
+    ("system", "컨텍스트:\n{context}\n\n대화 기록:\n{chat_history}"),
+    ("human", "{question}")
+])
+
+# 임베딩 모델별 벡터 차원
+_EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+# 상위 모델 재질의 여부를 판단하는 불확실성 표현
+_UNCERTAIN_ANSWER_MARKERS = ("모르겠", "확실하지 않", "알 수 없", "찾을 수 없", "정보가 부족", "정보가 없")
+
+# 로컬에 저장되는 FAISS 인덱스 파일 이름
+_FAISS_INDEX_NAME = "data_ai_assistant"
+
+
+def _build_business_term_document(term_data: Dict[str, Any]) -> Document:
+    """비즈니스 용어 문서 생성"""
+    content = f"""
+용어: {term_data['term']}
+정의: {term_data['definition']}
+카테고리: {term_data['category']}
+예시: {term_data['examples']}
+관련 테이블: {', '.join(term_data['related_tables'])}
+    """.strip()
+    
+    return Document(
+        page_content=content,
+        metadata={
+            "type": "business_term",
+            "term": term_data["term"],
+            "category": term_data["category"],
+            "source": f"term_{term_data['term']}"
+        }
+    )
+
+
+def _build_sql_example_document(i: int, example: Dict[str, Any]) -> Document:
+    """SQL 예시 문서 생성"""
+    content = f"""
+질문: {example['question']}
+SQL 쿼리:
+{example['sql']}
+
+설명: {example['explanation']}
+복잡도: {example['complexity']}
+키워드: {', '.join(example['keywords'])}
+    """.strip()
+    
+    return Document(
+        page_content=content,
+        metadata={
+            "type": "sql_example",
+            "complexity": example["complexity"],
+            "keywords": example["keywords"],
+            "source": f"sql_example_{i}"
+        }
+    )
+
+
+_BUSINESS_TERM_DOCS = tuple(_build_business_term_document(term) for term in _BUSINESS_TERMS)
+_SQL_EXAMPLE_DOCS = tuple(_build_sql_example_document(i, example) for i, example in enumerate(_SQL_EXAMPLES))
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """비동기 질의 임베딩을 공용 배치 큐로 보내는 LangChain 임베딩 래퍼"""
+    
+    def __init__(self, base: OpenAIEmbeddings):
+        self.base = base
+        self.model = base.model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.base.aembed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        # 동시에 들어온 질문들을 한 번의 /embeddings 요청으로 묶어 처리
+        return await embedding_service.embed_text(text)
+
+
 class LangChainRAGEngine:
     """LangChain 기반 RAG 엔진"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            model="gpt-4",
-            temperature=0.1
-        )
-        self.embeddings = OpenAIEmbeddings(
+        self.llm = get_chat_model(settings.RAG_MODEL, temperature=0.1)
+        self.fallback_llm = get_chat_model(settings.RAG_FALLBACK_MODEL, temperature=0.1)
+        self.embeddings = BatchedQueryEmbeddings(OpenAIEmbeddings(
             api_key=settings.OPENAI_API_KEY,
-            model="text-embedding-ada-002"
-        )
+            model=embedding_service.model
+        ))
+        self.chunk_size = 1000
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
+            chunk_size=self.chunk_size,
             chunk_overlap=200,
             length_function=len
         )
         
-        # ChromaDB 설정
-        self.persist_directory = settings.CHROMADB_PERSIST_DIRECTORY
+        # FAISS 인덱스 저장 위치
+        self.persist_directory = settings.FAISS_INDEX_DIRECTORY
         os.makedirs(self.persist_directory, exist_ok=True)
         
-        self.vectorstore = None
-        self.memory = ConversationBufferMemory(
+        self.vectorstore: Optional[FAISS] = None
+        self._qa_chain: Optional[ConversationalRetrievalChain] = None
+        self._fallback_chain: Optional[ConversationalRetrievalChain] = None
+        self.retriever_k = 3
+        self._embedding_dimension: Optional[int] = None
+        # 동일 질문의 임베딩 호출과 벡터 검색을 생략하기 위한 컨텍스트 캐시
+        self._context_cache = TTLCache(maxsize=1024, ttl=settings.RAG_CONTEXT_CACHE_TTL)
+        # 토큰 한도를 넘는 오래된 대화는 버려 프롬프트 크기를 일정하게 유지 (정리 시 LLM 호출 없음)
+        self.memory = ConversationTokenBufferMemory(
+            llm=self.llm,
+            max_token_limit=settings.RAG_MEMORY_MAX_TOKENS,
             memory_key="chat_history",
             return_messages=True,
             output_key="answer"
@@ -48,12 +250,18 @@ class LangChainRAGEngine:
         self._initialize_vectorstore()
     
     def _initialize_vectorstore(self):
-        """벡터 스토어 초기화"""
+        """벡터 스토어 초기화 (저장된 FAISS 인덱스가 있으면 로드)"""
         try:
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings,
-                collection_name="data_ai_assistant"
+            index_path = os.path.join(self.persist_directory, f"{_FAISS_INDEX_NAME}.faiss")
+            if not os.path.exists(index_path):
+                # 빈 FAISS 인덱스는 만들 수 없으므로 지식 베이스 초기화 시 생성
+                logger.info("No saved FAISS index found; it will be built on knowledge base initialization")
+                return
+            
+            self.vectorstore = FAISS.load_local(
+                self.persist_directory,
+                self.embeddings,
+                index_name=_FAISS_INDEX_NAME
             )
             logger.info("Vector store initialized successfully")
         except Exception as e:
@@ -79,51 +287,102 @@ class LangChainRAGEngine:
             
             # 4. 문서를 벡터 스토어에 추가
             if documents:
-                # 기존 컬렉션 삭제 후 재생성
-                try:
-                    self.vectorstore.delete_collection()
-                except:
-                    pass
+                # 청크 크기보다 긴 문서만 분할 후 내용 해시를 ID로 사용 (동일 청크는 하나만 유지)
+                short_docs = [doc for doc in documents if len(doc.page_content) <= self.chunk_size]
+                long_docs = [doc for doc in documents if len(doc.page_content) > self.chunk_size]
+                split_docs = short_docs + self.text_splitter.split_documents(long_docs)
+                docs_by_id = {self._document_id(doc): doc for doc in split_docs}
                 
-                self.vectorstore = Chroma(
-                    persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings,
-                    collection_name="data_ai_assistant"
+                # 변경된 청크만 반영: 사라진 문서는 삭제하고 새 문서만 임베딩
+                existing_ids = (
+                    set(self.vectorstore.index_to_docstore_id.values())
+                    if self.vectorstore is not None else set()
                 )
+                stale_ids = list(existing_ids - docs_by_id.keys())
+                new_ids = [doc_id for doc_id in docs_by_id if doc_id not in existing_ids]
                 
-                # 텍스트 분할 및 추가
-                split_docs = self.text_splitter.split_documents(documents)
-                self.vectorstore.add_documents(split_docs)
+                if stale_ids:
+                    self.vectorstore.delete(ids=stale_ids)
+                if new_ids:
+                    await self._add_documents_with_embeddings(
+                        [docs_by_id[doc_id] for doc_id in new_ids],
+                        ids=new_ids
+                    )
+                if stale_ids or new_ids:
+                    self.vectorstore.save_local(self.persist_directory, index_name=_FAISS_INDEX_NAME)
+                    self._context_cache.clear()
                 
-                logger.info(f"Knowledge base initialized with {len(split_docs)} document chunks")
+                logger.info(
+                    f"Knowledge base initialized with {len(docs_by_id)} document chunks "
+                    f"({len(new_ids)} added, {len(stale_ids)} removed)"
+                )
             
         except Exception as e:
             logger.error(f"Error initializing knowledge base: {str(e)}")
             raise
     
+    @staticmethod
+    def _document_id(doc: Document) -> str:
+        """문서 내용과 메타데이터 기반의 안정적인 ID 생성"""
+        payload = doc.page_content + json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    async def _add_documents_with_embeddings(
+        self,
+        documents: List[Document],
+        ids: List[str],
+        batch_size: int = 500
+    ):
+        """임베딩을 배치 단위로 동시에 생성한 뒤 인덱스에 한 번에 추가"""
+        texts = [doc.page_content for doc in documents]
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        
+        batch_embeddings = await asyncio.gather(
+            *(self.embeddings.aembed_documents(batch) for batch in batches)
+        )
+        embeddings = [embedding for batch in batch_embeddings for embedding in batch]
+        
+        # 미리 계산한 임베딩을 전달하여 벡터 스토어의 자체 임베딩 단계 생략
+        text_embeddings = list(zip(texts, embeddings))
+        metadatas = [doc.metadata for doc in documents]
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(
+                text_embeddings,
+                self.embeddings,
+                metadatas=metadatas,
+                ids=ids
+            )
+        else:
+            self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    
+    async def _describe_table(self, table_name: str) -> Document:
+        """단일 테이블 스키마 문서 생성 (동기 인트로스펙션은 스레드에서 실행)"""
+        description, schema = await asyncio.gather(
+            asyncio.to_thread(db_introspection.generate_table_description, table_name),
+            asyncio.to_thread(db_introspection.get_table_schema, table_name)
+        )
+        
+        return Document(
+            page_content=description,
+            metadata={
+                "type": "table_schema",
+                "table_name": table_name,
+                "column_count": len(schema["columns"]),
+                "source": f"table_{table_name}"
+            }
+        )
+    
     async def _create_schema_documents(self) -> List[Document]:
         """테이블 스키마 문서 생성"""
-        documents = []
         try:
-            tables = db_introspection.get_all_tables()
+            tables = [
+                table_name for table_name in db_introspection.get_all_tables()
+                if not (table_name.startswith('pg_') or table_name in ['information_schema'])
+            ]
             
-            for table_name in tables:
-                if table_name.startswith('pg_') or table_name in ['information_schema']:
-                    continue
-                
-                description = db_introspection.generate_table_description(table_name)
-                schema = db_introspection.get_table_schema(table_name)
-                
-                doc = Document(
-                    page_content=description,
-                    metadata={
-                        "type": "table_schema",
-                        "table_name": table_name,
-                        "column_count": len(schema["columns"]),
-                        "source": f"table_{table_name}"
-                    }
-                )
-                documents.append(doc)
+            documents = list(await asyncio.gather(
+                *(self._describe_table(table_name) for table_name in tables)
+            ))
             
             logger.info(f"Created {len(documents)} schema documents")
             return documents
@@ -133,193 +392,72 @@ class LangChainRAGEngine:
     
     async def _create_business_term_documents(self) -> List[Document]:
         """비즈니스 용어 문서 생성"""
-        business_terms = [
-            {
-                "term": "고객",
-                "definition": "제품이나 서비스를 구매하는 개인 또는 기업",
-                "category": "business",
-                "examples": "customers 테이블의 데이터",
-                "related_tables": ["customers", "orders"]
-            },
-            {
-                "term": "주문",
-                "definition": "고객이 제품을 구매하는 거래",
-                "category": "business",
-                "examples": "orders 테이블의 데이터",
-                "related_tables": ["orders", "customers", "products"]
-            },
-            {
-                "term": "제품",
-                "definition": "판매되는 상품이나 서비스",
-                "category": "business",
-                "examples": "products 테이블의 데이터",
-                "related_tables": ["products", "orders"]
-            },
-            {
-                "term": "매출",
-                "definition": "판매로 인한 수익 금액",
-                "category": "finance",
-                "examples": "orders 테이블의 total_amount 컬럼",
-                "related_tables": ["orders"]
-            },
-            {
-                "term": "재고",
-                "definition": "판매 가능한 제품의 수량",
-                "category": "inventory",
-                "examples": "products 테이블의 stock_quantity 컬럼",
-                "related_tables": ["products"]
-            }
-        ]
-        
-        documents = []
-        for term_data in business_terms:
-            content = f"""
-용어: {term_data['term']}
-정의: {term_data['definition']}
-카테고리: {term_data['category']}
-예시: {term_data['examples']}
-관련 테이블: {', '.join(term_data['related_tables'])}
-            """.strip()
-            
-            doc = Document(
-                page_content=content,
-                metadata={
-                    "type": "business_term",
-                    "term": term_data["term"],
-                    "category": term_data["category"],
-                    "source": f"term_{term_data['term']}"
-                }
-            )
-            documents.append(doc)
-        
-        logger.info(f"Created {len(documents)} business term documents")
-        return documents
+        logger.info(f"Created {len(_BUSINESS_TERM_DOCS)} business term documents")
+        return list(_BUSINESS_TERM_DOCS)
     
     async def _create_sql_example_documents(self) -> List[Document]:
         """SQL 예시 문서 생성"""
-        sql_examples = [
-            {
-                "question": "모든 고객 목록을 보여주세요",
-                "sql": "SELECT id, name, email, phone, created_at FROM customers ORDER BY created_at DESC;",
-                "explanation": "customers 테이블의 모든 레코드를 최신 순으로 조회합니다.",
-                "complexity": "simple",
-                "keywords": ["고객", "목록", "전체", "모든"]
-            },
-            {
-                "question": "총 주문 금액이 가장 높은 고객을 찾아주세요",
-                "sql": """SELECT c.id, c.name, SUM(o.total_amount) as total_spent 
-                         FROM customers c 
-                         JOIN orders o ON c.id = o.customer_id 
-                         GROUP BY c.id, c.name 
-                         ORDER BY total_spent DESC 
-                         LIMIT 1;""",
-                "explanation": "고객별 총 주문 금액을 계산하여 가장 많이 구매한 고객을 조회합니다.",
-                "complexity": "medium",
-                "keywords": ["총", "주문", "금액", "높은", "고객", "최고"]
-            },
-            {
-                "question": "카테고리별 제품 수량을 보여주세요",
-                "sql": "SELECT category, COUNT(*) as product_count FROM products GROUP BY category ORDER BY product_count DESC;",
-                "explanation": "제품을 카테고리별로 그룹화하여 각 카테고리의 제품 수를 조회합니다.",
-                "complexity": "simple",
-                "keywords": ["카테고리", "제품", "수량", "개수"]
-            },
-            {
-                "question": "재고가 부족한 제품을 찾아주세요",
-                "sql": "SELECT id, name, stock_quantity, category FROM products WHERE stock_quantity < 10 ORDER BY stock_quantity ASC;",
-                "explanation": "재고가 10개 미만인 제품들을 재고 수량 순으로 조회합니다.",
-                "complexity": "simple",
-                "keywords": ["재고", "부족", "제품", "적은"]
-            },
-            {
-                "question": "최근 한 달간 주문 현황을 보여주세요",
-                "sql": """SELECT DATE(order_date) as order_day, 
-                         COUNT(*) as order_count,
-                         SUM(total_amount) as daily_revenue
-                         FROM orders 
-                         WHERE order_date >= CURRENT_DATE - INTERVAL '30 days'
-                         GROUP BY DATE(order_date)
-                         ORDER BY order_day DESC;""",
-                "explanation": "최근 30일간의 일별 주문 건수와 매출을 조회합니다.",
-                "complexity": "medium",
-                "keywords": ["최근", "한 달", "주문", "현황", "매출"]
-            }
-        ]
-        
-        documents = []
-        for i, example in enumerate(sql_examples):
-            content = f"""
-질문: {example['question']}
-SQL 쿼리:
-{example['sql']}
-
-설명: {example['explanation']}
-복잡도: {example['complexity']}
-키워드: {', '.join(example['keywords'])}
-            """.strip()
-            
-            doc = Document(
-                page_content=content,
-                metadata={
-                    "type": "sql_example",
-                    "complexity": example["complexity"],
-                    "keywords": example["keywords"],
-                    "source": f"sql_example_{i}"
-                }
-            )
-            documents.append(doc)
-        
-        logger.info(f"Created {len(documents)} SQL example documents")
-        return documents
+        logger.info(f"Created {len(_SQL_EXAMPLE_DOCS)} SQL example documents")
+        return list(_SQL_EXAMPLE_DOCS)
     
-    def create_qa_chain(self) -> ConversationalRetrievalChain:
+    def create_qa_chain(self, llm: Optional[ChatOpenAI] = None, use_memory: bool = True) -> ConversationalRetrievalChain:
         """질의응답 체인 생성"""
-        template = """
-당신은 데이터베이스 전문가입니다. 주어진 컨텍스트와 대화 기록을 바탕으로 사용자의 질문에 답변하세요.
-
-컨텍스트:
-{context}
-
-대화 기록:
-{chat_history}
-
-사용자 질문: {question}
-
-답변할 때 다음 사항을 고려하세요:
-1. 테이블 스키마 정보를 정확히 활용하세요
-2. 비즈니스 용어를 올바르게 해석하세요
-3. 적절한 SQL 쿼리를 제안하세요
-4. 안전한 SELECT 문만 사용하세요
-5. 명확하고 구체적으로 답변하세요
-
-답변:"""
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["context", "chat_history", "question"]
-        )
+        if self.vectorstore is None:
+            raise RuntimeError("지식 베이스가 초기화되지 않았습니다.")
         
         return ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
+            llm=llm or self.llm,
             retriever=self.vectorstore.as_retriever(
                 search_type="similarity",
-                search_kwargs={"k": 5}
+                search_kwargs={"k": self.retriever_k}
             ),
-            memory=self.memory,
-            combine_docs_chain_kwargs={"prompt": prompt},
+            memory=self.memory if use_memory else None,
+            combine_docs_chain_kwargs={"prompt": _QA_PROMPT},
             return_source_documents=True,
             verbose=True
         )
     
+    def get_qa_chain(self) -> ConversationalRetrievalChain:
+        """질의응답 체인 조회 (최초 호출 시 생성 후 재사용)"""
+        if self._qa_chain is None:
+            self._qa_chain = self.create_qa_chain()
+        return self._qa_chain
+    
+    def get_fallback_chain(self) -> ConversationalRetrievalChain:
+        """상위 모델 재질의용 체인 조회 (대화 메모리는 기본 체인이 관리)"""
+        if self._fallback_chain is None:
+            self._fallback_chain = self.create_qa_chain(llm=self.fallback_llm, use_memory=False)
+        return self._fallback_chain
+    
+    @staticmethod
+    def _is_uncertain_answer(answer: str) -> bool:
+        """답변에 불확실성 표현이 포함되어 있는지 확인"""
+        return any(marker in answer for marker in _UNCERTAIN_ANSWER_MARKERS)
+    
+    async def _ask_with_fallback(self, question: str) -> Dict[str, Any]:
+        """상위 모델로 재질의하고 메모리의 마지막 답변을 교체"""
+        # 방금 저장된 질문/답변을 제외한 대화 기록 사용
+        chat_history = self.memory.load_memory_variables({})["chat_history"][:-2]
+        result = await self.get_fallback_chain().ainvoke({
+            "question": question,
+            "chat_history": chat_history
+        })
+        self.memory.chat_memory.messages[-1] = AIMessage(content=result["answer"])
+        return result
+    
     async def ask_question(self, question: str) -> Dict[str, Any]:
         """질문 처리"""
         try:
-            qa_chain = self.create_qa_chain()
+            qa_chain = self.get_qa_chain()
             
-            result = qa_chain({
+            result = await qa_chain.ainvoke({
                 "question": question
             })
             
+            if self._is_uncertain_answer(result["answer"]):
+                logger.info(f"Uncertain answer from {settings.RAG_MODEL}, retrying with {settings.RAG_FALLBACK_MODEL}")
+                result = await self._ask_with_fallback(question)
+            
             return {
                 "answer": result["answer"],
                 "source_documents": [
@@ -342,11 +480,48 @@ SQL 쿼리:
                 "chat_history": []
             }
     
-    async def get_relevant_context(self, question: str, k: int = 5) -> List[Dict[str, Any]]:
-        """관련 컨텍스트 검색"""
+    async def ask_question_stream(self, question: str) -> AsyncIterator[str]:
+        """질문 처리 (답변을 토큰 단위로 스트리밍)"""
+        if self.vectorstore is None:
+            raise RuntimeError("지식 베이스가 초기화되지 않았습니다.")
+        
+        # 첫 토큰까지의 지연을 줄이기 위해 질문 재작성 단계 없이 바로 검색
+        docs = await self.vectorstore.asimilarity_search(question, k=self.retriever_k)
+        chat_history = get_buffer_string(self.memory.load_memory_variables({})["chat_history"])
+        
+        chunks = []
+        async for chunk in (_QA_PROMPT | self.llm).astream({
+            "context": "\n\n".join(doc.page_content for doc in docs),
+            "chat_history": chat_history,
+            "question": question
+        }):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+        
+        self.memory.save_context({"question": question}, {"answer": "".join(chunks)})
+    
+    async def get_relevant_context(
+        self,
+        question: str,
+        k: int = 3,
+        embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """관련 컨텍스트 검색 (질문 임베딩이 이미 있으면 재사용)"""
         try:
-            docs = self.vectorstore.similarity_search(question, k=k)
-            return [
+            if self.vectorstore is None:
+                return []
+            
+            cache_key = (hashlib.sha256(question.encode()).digest(), k)
+            cached = self._context_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+            
+            if embedding is not None:
+                docs = await self.vectorstore.asimilarity_search_by_vector(embedding, k=k)
+            else:
+                docs = await self.vectorstore.asimilarity_search(question, k=k)
+            context = [
                 {
                     "content": doc.page_content,
                     "metadata": doc.metadata,
@@ -354,6 +529,8 @@ SQL 쿼리:
                 }
                 for doc in docs
             ]
+            self._context_cache[cache_key] = context
+            return list(context)
         except Exception as e:
             logger.error(f"Error retrieving context: {str(e)}")
             return []
@@ -363,19 +540,29 @@ SQL 쿼리:
         self.memory.clear()
         logger.info("Conversation memory cleared")
     
+    async def _get_embedding_dimension(self) -> int:
+        """임베딩 차원 조회 (알 수 없는 모델은 최초 1회만 API로 확인)"""
+        if self._embedding_dimension is None:
+            self._embedding_dimension = _EMBEDDING_DIMENSIONS.get(self.embeddings.model)
+            if self._embedding_dimension is None:
+                self._embedding_dimension = len(await self.embeddings.aembed_query("test"))
+        return self._embedding_dimension
+    
     async def get_stats(self) -> Dict[str, Any]:
         """벡터 스토어 통계"""
         try:
-            collection = self.vectorstore._collection
             return {
-                "total_documents": collection.count(),
-                "collection_name": collection.name,
-                "embedding_dimension": len(self.embeddings.embed_query("test"))
+                "total_documents": self.vectorstore.index.ntotal if self.vectorstore is not None else 0,
+                "collection_name": _FAISS_INDEX_NAME,
+                "embedding_dimension": await self._get_embedding_dimension()
             }
         except Exception as e:
             logger.error(f"Error getting stats: {str(e)}")
             return {"error": str(e)}
 
 
-# 전역 LangChain RAG 엔진 인스턴스
-langchain_rag_engine = LangChainRAGEngine()
\ No newline at end of file
+# 전역 LangChain RAG 엔진 인스턴스 (최초 사용 시 생성)
+@lru_cache(maxsize=1)
+def get_rag_engine() -> LangChainRAGEngine:
+    """LangChain RAG 엔진 조회"""
+    return LangChainRAGEngine()
\ No newline at end of file
@@ -4,36 +4,47 @@ from langchain_experimental.sql import SQLDatabaseChain
 from langchain.agents import create_sql_agent
 from langchain.agents.agent_toolkits import SQLDatabaseToolkit
 from langchain.agents.agent_types import AgentType
-from langchain_openai import ChatOpenAI
 from langchain_community.utilities import SQLDatabase
 from langchain.prompts import PromptTemplate
 from langchain.schema import BaseOutputParser
 from langchain.memory import ConversationBufferMemory
-from sqlalchemy import create_engine, text
+from sqlalchemy import TextClause, text
 from app.core.config import settings
-from app.services.langchain_rag import langchain_rag_engine
+from app.core.database import engine as async_engine, sync_engine
+from app.services.langchain_rag import LangChainRAGEngine, get_rag_engine
+from app.services.llm_client import get_chat_model
+from app.services.sql_safety import has_limit, is_safe_select
+from functools import lru_cache
 import logging
 import re
 import json
 
 logger = logging.getLogger(__name__)
 
+# LLM 출력에서 SQL 추출용 정규식
+_SQL_BLOCK_RE = re.compile(r'```sql\s*\n(.*?)\n```', re.DOTALL)
+_SELECT_LINE_RE = re.compile(r'^[ \t]*(SELECT[^\n]*)', re.IGNORECASE | re.MULTILINE)
+
+
+@lru_cache(maxsize=256)
+def _limited_statement(sql_query: str) -> TextClause:
+    """LIMIT 바인드 파라미터가 추가된 쿼리 객체 생성 (쿼리 문자열별 캐시)"""
+    return text(f"{sql_query.rstrip().rstrip(';')} LIMIT :row_limit")
+
 
 class SQLQueryParser(BaseOutputParser):
     """SQL 쿼리 파싱을 위한 커스텀 파서"""
     
     def parse(self, text: str) -> str:
         # SQL 쿼리 추출
-        sql_match = re.search(r'```sql\n(.*?)\n```', text, re.DOTALL)
+        sql_match = _SQL_BLOCK_RE.search(text)
         if sql_match:
             return sql_match.group(1).strip()
         
-        # SQL로 시작하는 라인 찾기
-        lines = text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.upper().startswith('SELECT'):
-                return line
+        # SELECT로 시작하는 첫 라인 찾기 (전체 라인 분할 없이 검색)
+        line_match = _SELECT_LINE_RE.search(text)
+        if line_match:
+            return line_match.group(1).strip()
         
         return text.strip()
 
@@ -42,25 +53,28 @@ class LangChainSQLEngine:
     """LangChain 기반 Text-to-SQL 엔진"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            model="gpt-4",
-            temperature=0
-        )
+        self.llm = get_chat_model("gpt-4", temperature=0)
         
         # SQLDatabase 연결
-        self.engine = create_engine(settings.DATABASE_URL)
+        self.engine = sync_engine
         self.db = SQLDatabase(self.engine)
         
+        # 쿼리 검증/실행용 비동기 커넥션 풀
+        self.async_engine = async_engine
+        
         # 메모리
         self.memory = ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True
         )
         
-        self.rag_engine = langchain_rag_engine
         self._setup_chains()
     
+    @property
+    def rag_engine(self) -> LangChainRAGEngine:
+        """RAG 엔진 (실제 사용 시점에 생성)"""
+        return get_rag_engine()
+    
     def _setup_chains(self):
         """체인 설정"""
         # SQL 생성 체인
@@ -70,24 +84,30 @@ class LangChainSQLEngine:
             prompt=self._get_sql_prompt()
         )
         
-        # SQL 실행 체인
+        # SQL 실행 체인 (쿼리 검사용 추가 LLM 호출과 중간 단계 기록은 디버그 시에만 사용)
         self.sql_execute_chain = SQLDatabaseChain.from_llm(
             llm=self.llm,
             db=self.db,
-            verbose=True,
-            use_query_checker=True,
-            return_intermediate_steps=True
+            verbose=settings.DEBUG,
+            use_query_checker=settings.DEBUG,
+            return_intermediate_steps=settings.DEBUG
         )
         
-        # SQL 에이전트 (고급 기능용)
-        toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
-        self.sql_agent = create_sql_agent(
-            llm=self.llm,
-            toolkit=toolkit,
-            verbose=True,
-            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            handle_parsing_errors=True
-        )
+        # SQL 에이전트 (고급 기능용, 최초 사용 시 생성)
+        self._sql_agent = None
+    
+    def get_sql_agent(self):
+        """SQL 에이전트 조회 (최초 호출 시 생성 후 재사용)"""
+        if self._sql_agent is None:
+            toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
+            self._sql_agent = create_sql_agent(
+                llm=self.llm,
+                toolkit=toolkit,
+                verbose=settings.DEBUG,
+                agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                handle_parsing_errors=True
+            )
+        return self._sql_agent
     
     def _get_sql_prompt(self) -> PromptTemplate:
         """SQL 생성을 위한 프롬프트 템플릿"""
@@ -125,7 +145,7 @@ SQL 쿼리:"""
                 context = "\n\n".join([doc["content"] for doc in relevant_docs])
             
             # SQL 생성
-            sql_query = self.sql_chain.invoke({
+            sql_query = await self.sql_chain.ainvoke({
                 "question": question,
                 "context": context
             })
@@ -151,14 +171,18 @@ SQL 쿼리:"""
     async def execute_sql_with_chain(self, question: str) -> Dict[str, Any]:
         """SQL 체인을 사용한 실행"""
         try:
-            result = self.sql_execute_chain.invoke({
+            result = await self.sql_execute_chain.ainvoke({
                 "query": question
             })
             
+            # 중간 단계는 디버그 모드에서만 반환됨
+            intermediate_steps = result.get("intermediate_steps") or [{}]
+            last_step = intermediate_steps[-1]
+            
             return {
                 "success": True,
                 "answer": result["result"],
-                "sql_query": result.get("intermediate_steps", [{}])[-1].get("sql_cmd"),
+                "sql_query": last_step.get("sql_cmd") if isinstance(last_step, dict) else None,
                 "intermediate_steps": result.get("intermediate_steps", [])
             }
         except Exception as e:
@@ -172,7 +196,7 @@ SQL 쿼리:"""
     async def ask_with_agent(self, question: str) -> Dict[str, Any]:
         """SQL 에이전트를 사용한 질의"""
         try:
-            result = self.sql_agent.invoke({
+            result = await self.get_sql_agent().ainvoke({
                 "input": question
             })
             
@@ -200,8 +224,8 @@ SQL 쿼리:"""
                 }
             
             # 구문 검사
-            with self.engine.connect() as conn:
-                conn.execute(text(f"EXPLAIN {sql_query}"))
+            async with self.async_engine.connect() as conn:
+                await conn.execute(text(f"EXPLAIN {sql_query}"))
             
             return {
                 "is_valid": True,
@@ -215,23 +239,7 @@ SQL 쿼리:"""
     
     def _is_safe_query(self, sql_query: str) -> bool:
         """쿼리 안전성 검사"""
-        sql_lower = sql_query.lower().strip()
-        
-        # 금지된 키워드 검사
-        forbidden_keywords = [
-            'insert', 'update', 'delete', 'drop', 'create', 'alter',
-            'truncate', 'grant', 'revoke', 'exec', 'execute', 'call'
-        ]
-        
-        for keyword in forbidden_keywords:
-            if keyword in sql_lower:
-                return False
-        
-        # SELECT로 시작하는지 확인
-        if not sql_lower.startswith('select') and 'select' not in sql_lower:
-            return False
-        
-        return True
+        return is_safe_select(sql_query)
     
     async def execute_sql(self, sql_query: str, limit: int = 100) -> Dict[str, Any]:
         """SQL 실행"""
@@ -244,21 +252,20 @@ SQL 쿼리:"""
                     "data": None
                 }
             
-            # LIMIT 추가
-            if 'limit' not in sql_query.lower():
-                sql_query = f"{sql_query.rstrip(';')} LIMIT {limit};"
+            # LIMIT 추가 (바인드 파라미터로 전달하여 동일 쿼리의 실행 계획 재사용)
+            params = {}
+            if not has_limit(sql_query):
+                stmt = _limited_statement(sql_query)
+                params["row_limit"] = limit
+            else:
+                stmt = text(sql_query)
             
             # 쿼리 실행
-            with self.engine.connect() as conn:
-                result = conn.execute(text(sql_query))
+            async with self.async_engine.connect() as conn:
+                result = await conn.execute(stmt, params)
                 columns = list(result.keys())
-                rows = result.fetchall()
-                
-                data = [
-                    {col: str(row[i]) if row[i] is not None else None 
-                     for i, col in enumerate(columns)}
-                    for row in rows
-                ]
+                # 셀 값은 원본 타입 그대로 두고 응답 직렬화 단계에서 변환
+                data = [dict(row) for row in result.mappings()]
                 
                 return {
                     "success": True,
@@ -373,5 +380,8 @@ SQL 쿼리:"""
             return {"error": str(e)}
 
 
-# 전역 LangChain SQL 엔진 인스턴스
-langchain_sql_engine = LangChainSQLEngine()
\ No newline at end of file
+# 전역 LangChain SQL 엔진 인스턴스 (최초 사용 시 생성)
+@lru_cache(maxsize=1)
+def get_sql_engine() -> LangChainSQLEngine:
+    """LangChain SQL 엔진 조회"""
+    return LangChainSQLEngine()
\ No newline at end of file
@@ -1,26 +1,135 @@
-from typing import Dict, Any, List, Optional, TypedDict, Annotated
+from typing import Dict, Any, List, Optional, Tuple, TypedDict, Annotated, AsyncIterator
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolExecutor
 from langchain.tools import Tool
-from langchain_openai import ChatOpenAI
 from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_community.utilities import SQLDatabase
 from langchain.prompts import PromptTemplate
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, ProgrammingError
 from app.core.config import settings
-from app.services.langchain_rag import langchain_rag_engine
+from app.core.database import engine as async_engine, sync_engine
+from cachetools import TTLCache
+from cachetools.func import ttl_cache
+from functools import lru_cache
+from app.services.langchain_rag import LangChainRAGEngine, get_rag_engine
+from app.services.embedding import embedding_service
+from app.services.llm_client import get_chat_model
+from app.services.semantic_cache import SemanticCache
+from app.services.sql_safety import prepare_select
+import asyncio
+import pandas as pd
 import logging
 import json
 import re
-from datetime import datetime
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# 에이전트가 실행하는 쿼리의 최대 행 수
+_ROW_LIMIT = 100
+
+# 질문 분석 + SQL 생성 프롬프트 (한 번만 파싱하여 재사용)
+_PLAN_PROMPT = PromptTemplate.from_template("""
+다음 질문의 복잡도를 분류하고, 데이터베이스 질의를 위한 PostgreSQL 쿼리를 생성하세요.
+
+질문: {question}
+
+데이터베이스 스키마:
+{schema_info}
+
+관련 컨텍스트:
+{context}
+
+복잡도 분류 기준:
+- simple: 단순한 조회, 기본적인 필터링
+- complex: 조인, 그룹화, 집계 함수 필요
+- analytical: 고급 분석, 통계, 트렌드 분석
+
+SQL 규칙:
+1. SELECT 문만 사용 (INSERT, UPDATE, DELETE 금지)
+2. 안전한 쿼리만 생성
+3. 결과는 100개로 제한 (LIMIT 100)
+4. 복잡한 분석의 경우 적절한 집계 함수 사용
+5. PostgreSQL 문법 준수
+
+다음 JSON 형식으로만 응답하세요:
+{{"analysis_type": "simple | complex | analytical", "sql_query": "SELECT ..."}}
+""")
+
+# 최종 답변 생성 프롬프트
+_ANSWER_PROMPT = PromptTemplate.from_template("""
+사용자 질문에 대한 답변을 생성하세요.
+
+질문: {question}
+실행된 SQL: {sql_query}
+결과 행 수: {row_count}
+
+다음 형식으로 답변하세요:
+1. 질문에 대한 직접적인 답변
+2. 주요 결과 요약
+3. 필요시 추가 인사이트
+
+간결하고 명확하게 답변하세요.
+""")
+
+
+# 템플릿으로 바로 SQL을 만들 수 있는 단순 질문 패턴 (LLM 호출 생략)
+_TABLE_ALIASES = {
+    "고객": "customers",
+    "제품": "products",
+    "상품": "products",
+    "주문": "orders",
+}
+_QUESTION_END = r'\s*(?:인가요|입니까|이야|야|알려\s*줘|알려주세요|보여\s*줘|보여주세요)?\s*[?.!]*\s*$'
+_SQL_TEMPLATES = (
+    (
+        re.compile(
+            r'^\s*(?:전체\s*)?(?P<table>\w+?)\s*(?:테이블\s*)?(?:의|은|는)?\s*(?:전체\s*)?(?:개수|수|몇\s*개)'
+            r'(?:는|은|가)?\s*(?:몇\s*개)?' + _QUESTION_END,
+            re.IGNORECASE
+        ),
+        "SELECT COUNT(*) AS count FROM {table}"
+    ),
+    (
+        re.compile(r'^\s*(?:how\s+many\s+|count\s+(?:of\s+)?)(?:the\s+)?(?P<table>\w+)(?:\s+are\s+there)?\s*[?.!]*\s*$', re.IGNORECASE),
+        "SELECT COUNT(*) AS count FROM {table}"
+    ),
+    (
+        re.compile(r'^\s*(?:전체\s*)?(?P<table>\w+?)\s*(?:테이블\s*)?(?:전체\s*)?(?:목록|리스트)' + _QUESTION_END, re.IGNORECASE),
+        "SELECT * FROM {table} LIMIT 100"
+    ),
+    (
+        re.compile(r'^\s*(?:list|show)\s+(?:all\s+)?(?:the\s+)?(?P<table>\w+)\s*[?.!]*\s*$', re.IGNORECASE),
+        "SELECT * FROM {table} LIMIT 100"
+    ),
+)
+
+
+@ttl_cache(maxsize=512, ttl=settings.INTROSPECTION_CACHE_TTL)
+def _explain_query(sql_query: str) -> Optional[str]:
+    """EXPLAIN으로 구문 검증 후 오류 메시지 반환 (유효하면 None, 스키마가 바뀔 수 있으므로 TTL 동안만 캐시)"""
+    try:
+        with sync_engine.connect() as conn:
+            conn.execute(text(f"EXPLAIN {sql_query}"))
+        return None
+    except (ProgrammingError, DataError) as e:
+        # 쿼리 자체의 오류만 캐시하고 연결 오류 등은 그대로 전파
+        return str(e)
+
+
+# 노드별로 갱신하는 상태 키 (변경된 채널만 기록하도록 부분 상태로 반환)
+_PLAN_KEYS = ("analysis_type", "context", "sql_query", "error", "intermediate_steps", "step_details")
+_EXECUTE_KEYS = ("sql_result", "confidence", "error", "intermediate_steps", "step_details")
+_ANSWER_KEYS = ("final_answer", "intermediate_steps", "step_details")
+
 
 class AgentState(TypedDict):
     """에이전트 상태 정의"""
     messages: Annotated[List[BaseMessage], "대화 메시지 리스트"]
     question: str
+    question_embedding: Optional[List[float]]
     sql_query: Optional[str]
     sql_result: Optional[Dict[str, Any]]
     context: Optional[str]
@@ -28,25 +137,43 @@ class AgentState(TypedDict):
     confidence: float
     error: Optional[str]
     final_answer: Optional[str]
-    intermediate_steps: List[Dict[str, Any]]
+    intermediate_steps: List[Tuple[str, float]]  # (단계 이름, 소요 시간 초)
+    step_details: Optional[List[Dict[str, Any]]]  # 디버그 요청에서만 수집
 
 
 class DataAnalysisAgent:
     """LangGraph 기반 데이터 분석 에이전트"""
     
+    # 동기 도구 호출에서 코루틴을 실행할 프로세스 공용 이벤트 루프
+    _background_loop: Optional[asyncio.AbstractEventLoop] = None
+    _background_loop_lock = threading.Lock()
+    
     def __init__(self):
-        self.llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            model="gpt-4",
-            temperature=0.1
-        )
+        self.llm = get_chat_model("gpt-4", temperature=0.1)
+        self._plan_chain = _PLAN_PROMPT | self.llm
+        self._answer_chain = _ANSWER_PROMPT | self.llm
+        
+        # SQL 템플릿 적중률 (새 패턴 추가 우선순위 판단용)
+        self._template_hits = 0
+        self._plan_count = 0
         
         # 데이터베이스 연결
-        self.engine = create_engine(settings.DATABASE_URL)
+        self.engine = sync_engine
         self.db = SQLDatabase(self.engine)
         
-        # RAG 엔진
-        self.rag_engine = langchain_rag_engine
+        # 그래프 실행 중 쿼리용 비동기 커넥션 풀 (이벤트 루프를 막지 않음)
+        self.async_engine = async_engine
+        
+        # 테이블 스키마 정보 캐시 (매 SQL 생성마다 반복되는 리플렉션 방지)
+        self._schema_cache = TTLCache(maxsize=32, ttl=settings.INTROSPECTION_CACHE_TTL)
+        self._schema_cache_lock = threading.Lock()
+        
+        # 유사 질문 결과 캐시 (적중 시 그래프 전체 실행 생략)
+        self.answer_cache = SemanticCache(
+            max_size=settings.AGENT_CACHE_SIZE,
+            max_distance=settings.AGENT_CACHE_MAX_DISTANCE,
+            ttl=settings.AGENT_CACHE_TTL
+        )
         
         # 도구 설정
         self.tools = self._create_tools()
@@ -55,6 +182,11 @@ class DataAnalysisAgent:
         # 그래프 구성
         self.graph = self._create_graph()
     
+    @property
+    def rag_engine(self) -> LangChainRAGEngine:
+        """RAG 엔진 (실제 사용 시점에 생성)"""
+        return get_rag_engine()
+    
     def _create_tools(self) -> List[Tool]:
         """에이전트가 사용할 도구들 생성"""
         tools = [
@@ -66,12 +198,14 @@ class DataAnalysisAgent:
             Tool(
                 name="execute_sql",
                 description="안전한 SELECT SQL 쿼리를 실행합니다",
-                func=self._execute_sql_tool
+                func=self._execute_sql_tool,
+                coroutine=self._aexecute_sql_tool
             ),
             Tool(
                 name="search_context",
                 description="RAG를 통해 관련 컨텍스트를 검색합니다",
-                func=self._search_context_tool
+                func=self._search_context_tool,
+                coroutine=self._asearch_context_tool
             ),
             Tool(
                 name="validate_sql",
@@ -88,57 +222,91 @@ class DataAnalysisAgent:
     
     def _get_table_schema(self, table_name: str = "") -> str:
         """테이블 스키마 정보 조회"""
+        with self._schema_cache_lock:
+            cached = self._schema_cache.get(table_name)
+        if cached is not None:
+            return cached
+        
         try:
             if table_name:
-                return self.db.get_table_info([table_name])
+                schema_info = self.db.get_table_info([table_name])
             else:
-                return self.db.get_table_info()
+                schema_info = self.db.get_table_info()
         except Exception as e:
             return f"스키마 조회 오류: {str(e)}"
+        
+        with self._schema_cache_lock:
+            self._schema_cache[table_name] = schema_info
+        return schema_info
+    
+    def invalidate_schema_cache(self):
+        """테이블 스키마 캐시 초기화 (스키마 변경 후 호출)"""
+        with self._schema_cache_lock:
+            self._schema_cache.clear()
+        _explain_query.cache_clear()
+    
+    @staticmethod
+    def _format_sql_tool_result(result: Dict[str, Any]) -> str:
+        """SQL 실행 결과를 도구 출력(JSON)으로 변환"""
+        if result["success"]:
+            # Decimal, datetime 등 원본 타입은 도구 출력 직렬화 시에만 문자열로 변환
+            return json.dumps({
+                "success": True,
+                "data": result["data"][:10],  # 처음 10개 행만
+                "row_count": result["row_count"],
+                "columns": result["columns"]
+            }, ensure_ascii=False, default=str)
+        else:
+            return json.dumps({
+                "success": False,
+                "error": result["error"]
+            }, ensure_ascii=False)
+    
+    async def _aexecute_sql_tool(self, sql_query: str) -> str:
+        """SQL 실행 도구 (비동기)"""
+        try:
+            return self._format_sql_tool_result(await self._execute_sql_safe(sql_query))
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)}, ensure_ascii=False)
     
     def _execute_sql_tool(self, sql_query: str) -> str:
         """SQL 실행 도구"""
         try:
-            result = self._execute_sql_safe(sql_query)
-            if result["success"]:
-                return json.dumps({
-                    "success": True,
-                    "data": result["data"][:10],  # 처음 10개 행만
-                    "row_count": result["row_count"],
-                    "columns": result["columns"]
-                }, ensure_ascii=False)
-            else:
-                return json.dumps({
-                    "success": False,
-                    "error": result["error"]
-                }, ensure_ascii=False)
+            return self._format_sql_tool_result(self._execute_sql_sync(sql_query))
         except Exception as e:
             return json.dumps({"success": False, "error": str(e)}, ensure_ascii=False)
     
-    def _search_context_tool(self, question: str) -> str:
-        """컨텍스트 검색 도구"""
+    @classmethod
+    def _run_coroutine(cls, coro):
+        """백그라운드 이벤트 루프에서 코루틴 실행 후 결과 대기"""
+        with cls._background_loop_lock:
+            if cls._background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="agent-tool-loop", daemon=True).start()
+                cls._background_loop = loop
+        return asyncio.run_coroutine_threadsafe(coro, cls._background_loop).result()
+    
+    async def _asearch_context_tool(self, question: str) -> str:
+        """컨텍스트 검색 도구 (비동기)"""
         try:
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            context_docs = loop.run_until_complete(
-                self.rag_engine.get_relevant_context(question, k=3)
-            )
-            
-            context = "\n\n".join([doc["content"] for doc in context_docs])
-            return context
+            context_docs = await self.rag_engine.get_relevant_context(question, k=3)
+            return "\n\n".join([doc["content"] for doc in context_docs])
         except Exception as e:
             return f"컨텍스트 검색 오류: {str(e)}"
     
+    def _search_context_tool(self, question: str) -> str:
+        """컨텍스트 검색 도구"""
+        return self._run_coroutine(self._asearch_context_tool(question))
+    
     def _validate_sql_tool(self, sql_query: str) -> str:
         """SQL 검증 도구"""
         try:
             if self._is_safe_query(sql_query):
                 # 구문 검증
-                with self.engine.connect() as conn:
-                    conn.execute(text(f"EXPLAIN {sql_query}"))
-                return "SQL 쿼리가 안전하고 유효합니다."
+                explain_error = _explain_query(sql_query)
+                if explain_error is None:
+                    return "SQL 쿼리가 안전하고 유효합니다."
+                return f"SQL 검증 오류: {explain_error}"
             else:
                 return "SQL 쿼리가 안전하지 않습니다."
         except Exception as e:
@@ -161,14 +329,21 @@ class DataAnalysisAgent:
             analysis.append(f"총 {len(rows)}개의 레코드가 조회되었습니다.")
             analysis.append(f"컬럼: {', '.join(columns)}")
             
-            # 숫자 컬럼 분석
-            numeric_cols = []
-            for col in columns:
-                if rows and rows[0].get(col) and str(rows[0][col]).replace('.', '').replace('-', '').isdigit():
-                    numeric_cols.append(col)
+            # 숫자 컬럼 분석 (NULL을 제외한 값의 90% 이상이 숫자로 변환되는 컬럼)
+            df = pd.DataFrame(rows, columns=columns)
+            numeric_df = df.apply(pd.to_numeric, errors="coerce")
+            non_null = df.notna().sum()
+            ratio = numeric_df.notna().sum() / non_null.where(non_null > 0)
+            numeric_cols = [col for col in columns if ratio[col] > 0.9]
             
             if numeric_cols:
                 analysis.append(f"숫자 컬럼: {', '.join(numeric_cols)}")
+                stats = numeric_df[numeric_cols].agg(["min", "max", "mean"])
+                for col in numeric_cols:
+                    analysis.append(
+                        f"- {col}: 최소 {stats.at['min', col]:g}, "
+                        f"최대 {stats.at['max', col]:g}, 평균 {stats.at['mean', col]:g}"
+                    )
             
             return "\n".join(analysis)
         except Exception as e:
@@ -179,137 +354,117 @@ class DataAnalysisAgent:
         graph = StateGraph(AgentState)
         
         # 노드 추가
-        graph.add_node("analyzer", self._analyze_question)
-        graph.add_node("context_retriever", self._retrieve_context)
-        graph.add_node("sql_generator", self._generate_sql)
+        graph.add_node("planner", self._plan)
         graph.add_node("sql_executor", self._execute_sql)
-        graph.add_node("result_analyzer", self._analyze_result)
         graph.add_node("answer_generator", self._generate_answer)
         
         # 엣지 정의
-        graph.set_entry_point("analyzer")
+        graph.set_entry_point("planner")
         
-        graph.add_edge("analyzer", "context_retriever")
-        graph.add_edge("context_retriever", "sql_generator")
         graph.add_conditional_edges(
-            "sql_generator",
+            "planner",
             self._should_execute_sql,
             {
                 "execute": "sql_executor",
                 "error": "answer_generator"
             }
         )
-        graph.add_edge("sql_executor", "result_analyzer")
-        graph.add_edge("result_analyzer", "answer_generator")
+        graph.add_edge("sql_executor", "answer_generator")
         graph.add_edge("answer_generator", END)
         
         return graph.compile()
     
-    def _analyze_question(self, state: AgentState) -> AgentState:
-        """질문 분석"""
-        question = state["question"]
-        
-        # 질문 복잡도 분석
-        complexity_prompt = f"""
-다음 질문의 복잡도를 분석하고 분류하세요:
-
-질문: {question}
-
-분류 기준:
-- simple: 단순한 조회, 기본적인 필터링
-- complex: 조인, 그룹화, 집계 함수 필요
-- analytical: 고급 분석, 통계, 트렌드 분석
-
-응답은 simple, complex, analytical 중 하나만 반환하세요.
-"""
-        
-        try:
-            response = self.llm.invoke([HumanMessage(content=complexity_prompt)])
-            analysis_type = response.content.strip().lower()
-            
-            if analysis_type not in ["simple", "complex", "analytical"]:
-                analysis_type = "simple"
-        except:
-            analysis_type = "simple"
-        
-        state["analysis_type"] = analysis_type
-        state["intermediate_steps"].append({
-            "step": "question_analysis",
-            "result": f"질문 복잡도: {analysis_type}",
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        return state
-    
-    def _retrieve_context(self, state: AgentState) -> AgentState:
+    async def _retrieve_context(self, question: str, embedding: Optional[List[float]] = None) -> str:
         """컨텍스트 검색"""
-        question = state["question"]
-        
         try:
-            import asyncio
-            loop = asyncio.new_event_loop() if not asyncio.get_event_loop().is_running() else asyncio.get_event_loop()
-            
-            if loop.is_running():
-                # 이미 실행 중인 루프가 있는 경우
-                context_docs = []
-            else:
-                context_docs = loop.run_until_complete(
-                    self.rag_engine.get_relevant_context(question, k=5)
-                )
-            
-            context = "\n\n".join([doc["content"] for doc in context_docs])
-            state["context"] = context
-            
-            state["intermediate_steps"].append({
-                "step": "context_retrieval",
-                "result": f"관련 문서 {len(context_docs)}개 검색",
-                "timestamp": datetime.now().isoformat()
-            })
+            context_docs = await self.rag_engine.get_relevant_context(question, k=5, embedding=embedding)
+            return "\n\n".join([doc["content"] for doc in context_docs])
         except Exception as e:
             logger.error(f"Context retrieval error: {str(e)}")
-            state["context"] = ""
-        
-        return state
+            return ""
     
-    def _generate_sql(self, state: AgentState) -> AgentState:
-        """SQL 생성"""
+    @staticmethod
+    def _parse_plan(content: str) -> Dict[str, str]:
+        """계획 응답(JSON) 파싱 (JSON이 아니면 전체를 SQL로 간주)"""
+        content = re.sub(r'^```(?:json|sql)?\s*', '', content.strip())
+        content = re.sub(r'\s*```$', '', content).strip()
+        try:
+            plan = json.loads(content)
+            return {
+                "analysis_type": str(plan.get("analysis_type", "simple")).strip().lower(),
+                "sql_query": str(plan.get("sql_query") or "").strip()
+            }
+        except (ValueError, AttributeError):
+            return {"analysis_type": "simple", "sql_query": content}
+    
+    def _match_sql_template(self, question: str) -> Optional[str]:
+        """단순 질문 패턴과 일치하면 템플릿으로 SQL 생성"""
+        table_names = set(self.db.get_usable_table_names())
+        for pattern, template in _SQL_TEMPLATES:
+            match = pattern.match(question)
+            if not match:
+                continue
+            name = match.group("table").lower()
+            table = _TABLE_ALIASES.get(name, name)
+            if table in table_names:
+                return template.format(table=table)
+        return None
+    
+    @staticmethod
+    def _updates(state: AgentState, keys: Tuple[str, ...]) -> Dict[str, Any]:
+        """노드가 갱신한 키만 모은 부분 상태"""
+        return {key: state.get(key) for key in keys}
+    
+    @staticmethod
+    def _record_step(state: AgentState, step: str, started: float, detail: str):
+        """단계 이름과 소요 시간만 상태에 기록 (상세 내용은 로그와 디버그 응답으로만 전달)"""
+        elapsed = round(time.perf_counter() - started, 4)
+        state["intermediate_steps"].append((step, elapsed))
+        logger.info(f"Agent step {step} ({elapsed:.3f}s): {detail}", extra={"step": step, "payload": detail})
+        if state.get("step_details") is not None:
+            state["step_details"].append({"step": step, "result": detail, "elapsed": elapsed})
+    
+    async def _plan(self, state: AgentState) -> Dict[str, Any]:
+        """질문 분석과 SQL 생성을 한 번의 LLM 호출로 처리"""
         question = state["question"]
-        context = state.get("context", "")
-        analysis_type = state.get("analysis_type", "simple")
+        self._plan_count += 1
+        started = time.perf_counter()
         
-        # 테이블 스키마 정보
-        schema_info = self._get_table_schema()
+        # 정형화된 단순 질문은 LLM 호출 없이 템플릿으로 처리
+        template_sql = self._match_sql_template(question)
+        if template_sql and self._is_safe_query(template_sql):
+            self._template_hits += 1
+            logger.info(f"SQL template hit ({self._template_hits}/{self._plan_count}): {template_sql}")
+            state["analysis_type"] = "simple"
+            state["context"] = ""
+            state["sql_query"] = template_sql
+            state["error"] = None
+            self._record_step(state, "planning", started, f"질문 복잡도: simple, SQL 템플릿 사용: {template_sql}")
+            return self._updates(state, _PLAN_KEYS)
         
-        sql_prompt = f"""
-데이터베이스 질의를 위한 PostgreSQL 쿼리를 생성하세요.
-
-질문: {question}
-분석 유형: {analysis_type}
-
-데이터베이스 스키마:
-{schema_info}
-
-관련 컨텍스트:
-{context}
-
-규칙:
-1. SELECT 문만 사용 (INSERT, UPDATE, DELETE 금지)
-2. 안전한 쿼리만 생성
-3. 결과는 100개로 제한 (LIMIT 100)
-4. 복잡한 분석의 경우 적절한 집계 함수 사용
-5. PostgreSQL 문법 준수
-
-SQL 쿼리만 반환하세요:
-"""
+        # 컨텍스트 검색과 스키마 조회는 서로 독립적이므로 동시에 실행
+        context, schema_info = await asyncio.gather(
+            self._retrieve_context(question, state.get("question_embedding")),
+            asyncio.to_thread(self._get_table_schema)
+        )
+        state["context"] = context
+        self._record_step(state, "context_retrieval", started, f"관련 컨텍스트 {len(context)}자 검색")
         
+        started = time.perf_counter()
         try:
-            response = self.llm.invoke([HumanMessage(content=sql_prompt)])
-            sql_query = response.content.strip()
+            response = await self._plan_chain.ainvoke({
+                "question": question,
+                "schema_info": schema_info,
+                "context": context
+            })
+            plan = self._parse_plan(response.content)
+            
+            analysis_type = plan["analysis_type"]
+            if analysis_type not in ["simple", "complex", "analytical"]:
+                analysis_type = "simple"
+            state["analysis_type"] = analysis_type
             
-            # SQL 쿼리에서 불필요한 텍스트 제거
-            sql_query = re.sub(r'^```sql\s*', '', sql_query)
-            sql_query = re.sub(r'\s*```$', '', sql_query)
-            sql_query = sql_query.strip()
+            sql_query = plan["sql_query"]
             
             # 안전성 검증
             if self._is_safe_query(sql_query):
@@ -319,16 +474,13 @@ SQL 쿼리만 반환하세요:
                 state["sql_query"] = None
                 state["error"] = "안전하지 않은 SQL 쿼리가 생성되었습니다."
             
-            state["intermediate_steps"].append({
-                "step": "sql_generation",
-                "result": f"SQL 생성: {sql_query[:100]}...",
-                "timestamp": datetime.now().isoformat()
-            })
+            self._record_step(state, "planning", started, f"질문 복잡도: {analysis_type}, SQL 생성: {sql_query[:100]}...")
         except Exception as e:
+            state["analysis_type"] = state.get("analysis_type") or "simple"
             state["sql_query"] = None
             state["error"] = f"SQL 생성 오류: {str(e)}"
         
-        return state
+        return self._updates(state, _PLAN_KEYS)
     
     def _should_execute_sql(self, state: AgentState) -> str:
         """SQL 실행 여부 결정"""
@@ -337,12 +489,13 @@ SQL 쿼리만 반환하세요:
         else:
             return "error"
     
-    def _execute_sql(self, state: AgentState) -> AgentState:
-        """SQL 실행"""
+    async def _execute_sql(self, state: AgentState) -> Dict[str, Any]:
+        """SQL 실행 및 결과 분석"""
         sql_query = state["sql_query"]
+        started = time.perf_counter()
         
         try:
-            result = self._execute_sql_safe(sql_query)
+            result = await self._execute_sql_safe(sql_query)
             state["sql_result"] = result
             
             if result["success"]:
@@ -351,86 +504,69 @@ SQL 쿼리만 반환하세요:
                 state["confidence"] = 0.3
                 state["error"] = result["error"]
             
-            state["intermediate_steps"].append({
-                "step": "sql_execution",
-                "result": f"쿼리 실행: {result['success']}, 행 수: {result.get('row_count', 0)}",
-                "timestamp": datetime.now().isoformat()
-            })
+            self._record_step(state, "sql_execution", started, f"쿼리 실행: {result['success']}, 행 수: {result.get('row_count', 0)}")
+            
+            if result["success"]:
+                started = time.perf_counter()
+                # 간단한 분석 (별도 노드 없이 실행 결과에서 바로 계산)
+                analysis = {
+                    "row_count": len(result["data"]),
+                    "column_count": len(result["columns"]),
+                    "has_data": len(result["data"]) > 0
+                }
+                self._record_step(state, "result_analysis", started, f"데이터 분석: {analysis}")
         except Exception as e:
             state["sql_result"] = {"success": False, "error": str(e)}
             state["confidence"] = 0.1
             state["error"] = str(e)
         
-        return state
-    
-    def _analyze_result(self, state: AgentState) -> AgentState:
-        """결과 분석"""
-        sql_result = state.get("sql_result", {})
-        
-        if sql_result.get("success"):
-            data = sql_result.get("data", [])
-            columns = sql_result.get("columns", [])
-            
-            # 간단한 분석
-            analysis = {
-                "row_count": len(data),
-                "column_count": len(columns),
-                "has_data": len(data) > 0
-            }
-            
-            state["intermediate_steps"].append({
-                "step": "result_analysis",
-                "result": f"데이터 분석: {analysis}",
-                "timestamp": datetime.now().isoformat()
-            })
-        
-        return state
+        return self._updates(state, _EXECUTE_KEYS)
     
-    def _generate_answer(self, state: AgentState) -> AgentState:
-        """최종 답변 생성"""
+    async def _stream_answer(self, state: AgentState) -> AsyncIterator[str]:
+        """최종 답변 생성 (토큰 단위로 반환하고 완료 시 상태에 저장)"""
         question = state["question"]
         sql_query = state.get("sql_query")
-        sql_result = state.get("sql_result", {})
+        sql_result = state.get("sql_result") or {}
         error = state.get("error")
+        started = time.perf_counter()
         
         if error:
-            state["final_answer"] = f"죄송합니다. 질문 처리 중 오류가 발생했습니다: {error}"
+            answer = f"죄송합니다. 질문 처리 중 오류가 발생했습니다: {error}"
+            yield answer
         elif sql_result.get("success"):
-            data = sql_result.get("data", [])
             row_count = sql_result.get("row_count", 0)
             
-            answer_prompt = f"""
-사용자 질문에 대한 답변을 생성하세요.
-
-질문: {question}
-실행된 SQL: {sql_query}
-결과 행 수: {row_count}
-
-다음 형식으로 답변하세요:
-1. 질문에 대한 직접적인 답변
-2. 주요 결과 요약
-3. 필요시 추가 인사이트
-
-간결하고 명확하게 답변하세요.
-"""
-            
+            chunks = []
             try:
-                response = self.llm.invoke([HumanMessage(content=answer_prompt)])
-                state["final_answer"] = response.content.strip()
-            except:
-                state["final_answer"] = f"질문에 대한 결과를 찾았습니다. 총 {row_count}개의 결과가 있습니다."
+                async for chunk in self._answer_chain.astream({
+                    "question": question,
+                    "sql_query": sql_query,
+                    "row_count": row_count
+                }):
+                    if chunk.content:
+                        chunks.append(chunk.content)
+                        yield chunk.content
+                answer = "".join(chunks).strip()
+            except Exception:
+                # 이미 전송한 토큰이 있으면 그대로 답변으로 사용
+                answer = "".join(chunks).strip()
+                if not answer:
+                    answer = f"질문에 대한 결과를 찾았습니다. 총 {row_count}개의 결과가 있습니다."
+                    yield answer
         else:
-            state["final_answer"] = "질문에 대한 답변을 찾을 수 없습니다."
+            answer = "질문에 대한 답변을 찾을 수 없습니다."
+            yield answer
         
-        state["intermediate_steps"].append({
-            "step": "answer_generation",
-            "result": "최종 답변 생성 완료",
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        return state
+        state["final_answer"] = answer
+        self._record_step(state, "answer_generation", started, "최종 답변 생성 완료")
     
-    def _execute_sql_safe(self, sql_query: str) -> Dict[str, Any]:
+    async def _generate_answer(self, state: AgentState) -> Dict[str, Any]:
+        """최종 답변 생성"""
+        async for _ in self._stream_answer(state):
+            pass
+        return self._updates(state, _ANSWER_KEYS)
+    
+    async def _execute_sql_safe(self, sql_query: str) -> Dict[str, Any]:
         """안전한 SQL 실행"""
         try:
             if not self._is_safe_query(sql_query):
@@ -439,20 +575,46 @@ SQL 쿼리만 반환하세요:
                     "error": "안전하지 않은 쿼리입니다."
                 }
             
-            # LIMIT 추가
-            if 'limit' not in sql_query.lower():
-                sql_query = f"{sql_query.rstrip(';')} LIMIT 100;"
-            
-            with self.engine.connect() as conn:
-                result = conn.execute(text(sql_query))
+            # 스트리밍 결과(서버 측 커서)로 최대 행 수만큼만 가져옴
+            async with self.async_engine.connect() as conn:
+                result = await conn.stream(
+                    text(prepare_select(sql_query, _ROW_LIMIT)),
+                    execution_options={"max_row_buffer": _ROW_LIMIT}
+                )
                 columns = list(result.keys())
-                rows = result.fetchall()
+                data = [dict(row) for row in await result.mappings().fetchmany(_ROW_LIMIT)]
                 
-                data = [
-                    {col: str(row[i]) if row[i] is not None else None 
-                     for i, col in enumerate(columns)}
-                    for row in rows
-                ]
+                return {
+                    "success": True,
+                    "data": data,
+                    "columns": columns,
+                    "row_count": len(data)
+                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _execute_sql_sync(self, sql_query: str) -> Dict[str, Any]:
+        """안전한 SQL 실행 (이벤트 루프 밖의 동기 도구 호출용)"""
+        try:
+            if not self._is_safe_query(sql_query):
+                return {
+                    "success": False,
+                    "error": "안전하지 않은 쿼리입니다."
+                }
+            
+            # LIMIT이 없으면 구문 트리에 추가한 쿼리로 실행
+            # 서버 측 커서로 최대 행 수만큼만 가져와 쿼리의 LIMIT과 무관하게 메모리 사용량 제한
+            with self.engine.connect().execution_options(
+                stream_results=True,
+                max_row_buffer=_ROW_LIMIT
+            ) as conn:
+                result = conn.execute(text(prepare_select(sql_query, _ROW_LIMIT)))
+                columns = list(result.keys())
+                # 셀 값은 원본 타입 그대로 두고 응답 직렬화 단계에서 변환
+                data = [dict(row) for row in result.mappings().fetchmany(_ROW_LIMIT)]
                 
                 return {
                     "success": True,
@@ -468,55 +630,78 @@ SQL 쿼리만 반환하세요:
     
     def _is_safe_query(self, sql_query: str) -> bool:
         """쿼리 안전성 검사"""
-        sql_lower = sql_query.lower().strip()
+        # 파싱 결과는 캐시되므로 실행 단계에서 다시 파싱하지 않음
+        return prepare_select(sql_query, _ROW_LIMIT) is not None
+    
+    async def _lookup_answer_cache(self, question: str) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """질문 임베딩 계산 후 유사 질문 캐시 조회"""
+        try:
+            question_embedding = await embedding_service.embed_text(question)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {str(e)}")
+            return None, None
         
-        forbidden_keywords = [
-            'insert', 'update', 'delete', 'drop', 'create', 'alter',
-            'truncate', 'grant', 'revoke', 'exec', 'execute', 'call'
-        ]
+        cached = self.answer_cache.get(question_embedding, question)
+        return question_embedding, ({**cached, "question": question} if cached is not None else None)
+    
+    @staticmethod
+    def _initial_state(question: str, question_embedding: Optional[List[float]], debug: bool = False) -> AgentState:
+        """그래프 초기 상태 생성"""
+        return AgentState(
+            messages=[HumanMessage(content=question)],
+            question=question,
+            question_embedding=question_embedding,
+            sql_query=None,
+            sql_result=None,
+            context=None,
+            analysis_type=None,
+            confidence=0.0,
+            error=None,
+            final_answer=None,
+            intermediate_steps=[],
+            step_details=[] if debug else None
+        )
+    
+    def _build_result(self, question: str, final_state: AgentState) -> Dict[str, Any]:
+        """최종 상태를 응답 형식으로 변환 (성공 시 유사 질문 캐시에 저장)"""
+        sql_result = final_state.get("sql_result") or {}
+        step_details = final_state.get("step_details")
+        if step_details is None:
+            steps = [{"step": step, "elapsed": elapsed} for step, elapsed in final_state.get("intermediate_steps", [])]
+        else:
+            steps = step_details
         
-        for keyword in forbidden_keywords:
-            if keyword in sql_lower:
-                return False
+        result = {
+            "success": not bool(final_state.get("error")),
+            "question": question,
+            "answer": final_state.get("final_answer"),
+            "sql_query": final_state.get("sql_query"),
+            "data": sql_result.get("data"),
+            "columns": sql_result.get("columns"),
+            "row_count": sql_result.get("row_count"),
+            "confidence": final_state.get("confidence", 0.0),
+            "analysis_type": final_state.get("analysis_type"),
+            "intermediate_steps": steps,
+            "error": final_state.get("error")
+        }
         
-        if not sql_lower.startswith('select') and 'select' not in sql_lower:
-            return False
+        # 디버그 응답은 상세 단계 정보를 포함하므로 캐시하지 않음
+        if result["success"] and step_details is None and final_state.get("question_embedding") is not None:
+            self.answer_cache.put(final_state["question_embedding"], question, result)
         
-        return True
+        return result
     
-    async def process_question(self, question: str) -> Dict[str, Any]:
-        """질문 처리 메인 함수"""
+    async def process_question(self, question: str, debug: bool = False) -> Dict[str, Any]:
+        """질문 처리 메인 함수 (debug=True면 단계별 상세 내용 포함)"""
         try:
-            # 초기 상태 설정
-            initial_state = AgentState(
-                messages=[HumanMessage(content=question)],
-                question=question,
-                sql_query=None,
-                sql_result=None,
-                context=None,
-                analysis_type=None,
-                confidence=0.0,
-                error=None,
-                final_answer=None,
-                intermediate_steps=[]
-            )
+            # 유사 질문 캐시 조회 (계산한 임베딩은 상태에 담아 컨텍스트 검색에서 재사용)
+            question_embedding, cached = await self._lookup_answer_cache(question)
+            if cached is not None and not debug:
+                return cached
             
             # 그래프 실행
-            final_state = self.graph.invoke(initial_state)
-            
-            return {
-                "success": not bool(final_state.get("error")),
-                "question": question,
-                "answer": final_state.get("final_answer"),
-                "sql_query": final_state.get("sql_query"),
-                "data": final_state.get("sql_result", {}).get("data"),
-                "columns": final_state.get("sql_result", {}).get("columns"),
-                "row_count": final_state.get("sql_result", {}).get("row_count"),
-                "confidence": final_state.get("confidence", 0.0),
-                "analysis_type": final_state.get("analysis_type"),
-                "intermediate_steps": final_state.get("intermediate_steps", []),
-                "error": final_state.get("error")
-            }
+            final_state = await self.graph.ainvoke(self._initial_state(question, question_embedding, debug))
+            return self._build_result(question, final_state)
         except Exception as e:
             logger.error(f"Error in LangGraph agent: {str(e)}")
             return {
@@ -525,7 +710,50 @@ SQL 쿼리만 반환하세요:
                 "answer": f"처리 중 오류가 발생했습니다: {str(e)}",
                 "error": str(e)
             }
+    
+    async def process_question_stream(self, question: str, debug: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """질문 처리 (단계별 진행 상황과 답변 토큰을 순서대로 반환)"""
+        try:
+            question_embedding, cached = await self._lookup_answer_cache(question)
+            if cached is not None and not debug:
+                yield {"type": "result", "result": cached}
+                return
+            
+            # 그래프와 같은 순서로 노드를 실행하고 답변 생성 단계만 토큰 단위로 전달
+            state = self._initial_state(question, question_embedding, debug)
+            state.update(await self._plan(state))
+            step, elapsed = state["intermediate_steps"][-1]
+            yield {"type": "step", "step": step, "elapsed": elapsed}
+            
+            if self._should_execute_sql(state) == "execute":
+                state.update(await self._execute_sql(state))
+                sql_result = state.get("sql_result") or {}
+                yield {
+                    "type": "sql_result",
+                    "sql_query": state.get("sql_query"),
+                    "columns": sql_result.get("columns"),
+                    "row_count": sql_result.get("row_count")
+                }
+            
+            async for token in self._stream_answer(state):
+                yield {"type": "token", "content": token}
+            
+            yield {"type": "result", "result": self._build_result(question, state)}
+        except Exception as e:
+            logger.error(f"Error in LangGraph agent stream: {str(e)}")
+            yield {"type": "error", "error": str(e)}
+    
+    async def process_questions(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """여러 질문 일괄 처리 (중복 질문은 한 번만 실행)"""
+        # 동시에 실행되는 질문들의 임베딩은 임베딩 서비스에서 한 번의 API 호출로 묶임
+        unique_questions = list(dict.fromkeys(questions))
+        results = await asyncio.gather(*(self.process_question(q) for q in unique_questions))
+        by_question = dict(zip(unique_questions, results))
+        return [by_question[q] for q in questions]
 
 
-# 전역 LangGraph 에이전트 인스턴스
-langgraph_agent = DataAnalysisAgent()
\ No newline at end of file
+# 전역 LangGraph 에이전트 인스턴스 (최초 사용 시 생성)
+@lru_cache(maxsize=1)
+def get_agent() -> DataAnalysisAgent:
+    """LangGraph 에이전트 조회"""
+    return DataAnalysisAgent()
\ No newline at end of file
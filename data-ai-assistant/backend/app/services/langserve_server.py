@@ -1,15 +1,15 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator
+from functools import lru_cache
 from fastapi import FastAPI
 from langserve import add_routes
 from langchain.schema.runnable import RunnableLambda
-from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import BaseMessage
 from pydantic import BaseModel, Field
-from app.core.config import settings
-from app.services.langgraph_agent import langgraph_agent
-from app.services.langchain_rag import langchain_rag_engine
-from app.services.langchain_sql import langchain_sql_engine
+from app.services.langgraph_agent import get_agent
+from app.services.langchain_rag import get_rag_engine
+from app.services.langchain_sql import get_sql_engine
+from app.services.llm_client import get_chat_model
 import logging
 import asyncio
 
@@ -22,6 +22,7 @@ class QuestionInput(BaseModel):
     question: str = Field(description="사용자 질문")
     context: Optional[str] = Field(default=None, description="추가 컨텍스트")
     method: Optional[str] = Field(default="agent", description="처리 방법: agent, rag, sql")
+    debug: bool = Field(default=False, description="단계별 상세 처리 내용 포함 여부")
 
 
 class QuestionOutput(BaseModel):
@@ -61,15 +62,51 @@ class SQLOutput(BaseModel):
     error: Optional[str]
 
 
+def _to_question_output(result: Dict[str, Any]) -> QuestionOutput:
+    """에이전트 결과를 출력 모델로 변환"""
+    return QuestionOutput(
+        success=result["success"],
+        answer=result["answer"],
+        sql_query=result.get("sql_query"),
+        data=result.get("data"),
+        confidence=result.get("confidence"),
+        method="langgraph_agent",
+        intermediate_steps=result.get("intermediate_steps")
+    )
+
+
+class AgentRunnable(RunnableLambda):
+    """일괄/스트리밍 요청을 에이전트의 전용 처리 경로로 전달하는 RunnableLambda"""
+    
+    async def astream(self, input: QuestionInput, config=None, **kwargs) -> AsyncIterator[Any]:
+        # 단계별 진행 상황과 답변 토큰을 먼저 보내고 마지막에 전체 결과 전달
+        async for event in get_agent().process_question_stream(input.question, input.debug):
+            if event["type"] == "result":
+                yield _to_question_output(event["result"])
+            else:
+                yield event
+    
+    async def abatch(self, inputs: List[QuestionInput], config=None, *, return_exceptions: bool = False, **kwargs) -> List[QuestionOutput]:
+        try:
+            results = await get_agent().process_questions([item.question for item in inputs])
+            return [_to_question_output(result) for result in results]
+        except Exception as e:
+            logger.error(f"Agent batch error: {str(e)}")
+            return [
+                QuestionOutput(
+                    success=False,
+                    answer=f"에이전트 처리 중 오류: {str(e)}",
+                    method="langgraph_agent"
+                )
+                for _ in inputs
+            ]
+
+
 class LangServeServer:
     """LangServe 기반 체인 서버"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            model="gpt-4",
-            temperature=0.1
-        )
+        self.llm = get_chat_model("gpt-4", temperature=0.1)
         
         # 체인들 생성
         self.agent_chain = self._create_agent_chain()
@@ -81,16 +118,8 @@ class LangServeServer:
         """LangGraph 에이전트 체인"""
         async def agent_runner(input_data: QuestionInput) -> QuestionOutput:
             try:
-                result = await langgraph_agent.process_question(input_data.question)
-                return QuestionOutput(
-                    success=result["success"],
-                    answer=result["answer"],
-                    sql_query=result.get("sql_query"),
-                    data=result.get("data"),
-                    confidence=result.get("confidence"),
-                    method="langgraph_agent",
-                    intermediate_steps=result.get("intermediate_steps")
-                )
+                result = await get_agent().process_question(input_data.question, input_data.debug)
+                return _to_question_output(result)
             except Exception as e:
                 logger.error(f"Agent chain error: {str(e)}")
                 return QuestionOutput(
@@ -99,13 +128,13 @@ class LangServeServer:
                     method="langgraph_agent"
                 )
         
-        return RunnableLambda(agent_runner)
+        return AgentRunnable(agent_runner)
     
     def _create_rag_chain(self) -> RunnableLambda:
         """RAG 체인"""
         async def rag_runner(input_data: RAGInput) -> RAGOutput:
             try:
-                result = await langchain_rag_engine.ask_question(input_data.question)
+                result = await get_rag_engine().ask_question(input_data.question)
                 return RAGOutput(
                     answer=result["answer"],
                     source_documents=result["source_documents"]
@@ -123,7 +152,7 @@ class LangServeServer:
         """SQL 체인"""
         async def sql_runner(input_data: SQLInput) -> SQLOutput:
             try:
-                result = await langchain_sql_engine.process_question_advanced(
+                result = await get_sql_engine().process_question_advanced(
                     input_data.question, 
                     method=input_data.method
                 )
@@ -233,5 +262,8 @@ class LangServeServer:
         return self.simple_chat_chain.invoke({"question": question})
 
 
-# 전역 LangServe 서버 인스턴스
-langserve_server = LangServeServer()
\ No newline at end of file
+# 전역 LangServe 서버 인스턴스 (최초 사용 시 생성)
+@lru_cache(maxsize=1)
+def get_langserve_server() -> LangServeServer:
+    """LangServe 서버 조회"""
+    return LangServeServer()
\ No newline at end of file
@@ -0,0 +1,33 @@
+from functools import lru_cache
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+from app.core.config import settings
+from app.core.shutdown import register_shutdown_hook
+
+# 모든 비동기 OpenAI 호출이 공유하는 HTTP 클라이언트 (keep-alive, HTTP/2 다중화)
+async_http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT),
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128)
+)
+# 앱 종료 시 열린 커넥션 정리
+register_shutdown_hook(async_http_client.aclose)
+
+async_openai_client = openai.AsyncOpenAI(
+    api_key=settings.OPENAI_API_KEY,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    http_client=async_http_client
+)
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str = "gpt-4", temperature: float = 0.1) -> ChatOpenAI:
+    """모델/온도별 공유 ChatOpenAI 인스턴스 조회"""
+    return ChatOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        model=model,
+        temperature=temperature,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        async_client=async_openai_client.chat.completions
+    )
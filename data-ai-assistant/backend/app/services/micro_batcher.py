@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """짧은 시간 안에 들어온 단일 요청을 모아 한 번의 배치 호출로 처리"""
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        max_batch_wait: float,
+        name: str = "batch"
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.name = name
+        
+        # 이벤트 루프별 (큐, 워커) - asyncio 큐는 생성된 루프에서만 사용 가능
+        self._workers: Dict[asyncio.AbstractEventLoop, Tuple[asyncio.Queue, asyncio.Task]] = {}
+        self._workers_lock = threading.Lock()
+    
+    def _ensure_worker(self) -> asyncio.Queue:
+        """배치 워커 시작 (현재 이벤트 루프 기준, 닫힌 루프의 워커는 정리)"""
+        loop = asyncio.get_running_loop()
+        with self._workers_lock:
+            for closed_loop in [other for other in self._workers if other.is_closed()]:
+                del self._workers[closed_loop]
+            
+            worker = self._workers.get(loop)
+            if worker is None or worker[1].done():
+                queue = asyncio.Queue()
+                worker = (queue, loop.create_task(self._batch_worker(queue)))
+                self._workers[loop] = worker
+            return worker[0]
+    
+    async def _batch_worker(self, queue: asyncio.Queue):
+        """대기 중인 요청을 모아 배치 함수 한 번으로 처리"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[Any, asyncio.Future]] = [await queue.get()]
+            deadline = loop.time() + self.max_batch_wait
+            
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            items = [item for item, _ in batch]
+            try:
+                results = await self.batch_fn(items)
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                logger.error(f"Error running {self.name}: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def submit(self, item: Any) -> Any:
+        """요청 하나를 배치에 추가하고 결과 대기"""
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((item, future))
+        return await future
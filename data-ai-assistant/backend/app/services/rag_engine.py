@@ -1,3 +1,6 @@
+import asyncio
+import hashlib
+import json
 from typing import List, Dict, Any, Optional
 from app.services.vector_store import vector_store
 from app.services.embedding import embedding_service
@@ -6,6 +9,18 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 지식 베이스 컬렉션과 컨텍스트 키별 문서 type 메타데이터
+_KNOWLEDGE_BASE = "knowledge_base"
+_DOC_TYPES = {
+    "table_schemas": "table_schema",
+    "business_terms": "business_term",
+    "sql_examples": "sql_example"
+}
+_CONTEXT_KEYS = {doc_type: key for key, doc_type in _DOC_TYPES.items()}
+
+# 한 번의 검색으로 종류별 결과를 채우기 위해 필요한 수보다 넉넉히 가져오는 배수
+_OVERFETCH_FACTOR = 3
+
 
 class RAGEngine:
     """RAG (Retrieval-Augmented Generation) 엔진"""
@@ -32,39 +47,55 @@ class RAGEngine:
             logger.error(f"Error initializing knowledge base: {str(e)}")
             raise
     
+    async def _index_documents(
+        self,
+        context_key: str,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str]
+    ) -> bool:
+        """내용이 바뀐 경우에만 해당 종류의 문서 재색인 (재색인 여부 반환)"""
+        doc_type = _DOC_TYPES[context_key]
+        hash_key = f"content_hash_{doc_type}"
+        content_hash = hashlib.sha256(
+            json.dumps([documents, metadatas, ids], sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()
+        if self.vector_store.get_content_hash(_KNOWLEDGE_BASE, hash_key) == content_hash:
+            logger.info(f"{context_key} is up to date, skipping indexing")
+            return False
+        
+        await self.vector_store.replace_documents(
+            collection_name=_KNOWLEDGE_BASE,
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids,
+            content_hash=content_hash,
+            where={"type": doc_type},
+            hash_key=hash_key
+        )
+        return True
+    
     async def _index_table_schemas(self):
         """테이블 스키마 정보 인덱싱"""
         try:
-            tables = self.db_introspection.get_all_tables()
+            # 테이블 설명은 디스크 캐시를 사용하고 DDL이 바뀐 테이블만 다시 생성
+            tables = await asyncio.to_thread(self.db_introspection.describe_tables)
             
             documents = []
             metadatas = []
             ids = []
             
-            for table_name in tables:
-                # 시스템 테이블 제외
-                if table_name.startswith('pg_') or table_name in ['information_schema']:
-                    continue
-                
-                description = self.db_introspection.generate_table_description(table_name)
-                schema = self.db_introspection.get_table_schema(table_name)
-                
-                documents.append(description)
+            for table_name, table in tables.items():
+                documents.append(table["description"])
                 metadatas.append({
                     "type": "table_schema",
                     "table_name": table_name,
-                    "column_count": len(schema["columns"]),
-                    "has_foreign_keys": len(schema["foreign_keys"]) > 0
+                    "column_count": table["column_count"],
+                    "has_foreign_keys": table["has_foreign_keys"]
                 })
                 ids.append(f"table_{table_name}")
             
-            if documents:
-                await self.vector_store.add_documents(
-                    collection_name="table_schemas",
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+            if documents and await self._index_documents("table_schemas", documents, metadatas, ids):
                 logger.info(f"Indexed {len(documents)} table schemas")
         except Exception as e:
             logger.error(f"Error indexing table schemas: {str(e)}")
@@ -120,13 +151,8 @@ class RAGEngine:
                 })
                 ids.append(f"term_{term_data['term']}")
             
-            await self.vector_store.add_documents(
-                collection_name="business_terms",
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            logger.info(f"Indexed {len(documents)} business terms")
+            if await self._index_documents("business_terms", documents, metadatas, ids):
+                logger.info(f"Indexed {len(documents)} business terms")
         except Exception as e:
             logger.error(f"Error indexing business terms: {str(e)}")
             raise
@@ -175,45 +201,35 @@ class RAGEngine:
                 })
                 ids.append(f"sql_example_{i}")
             
-            await self.vector_store.add_documents(
-                collection_name="sql_examples",
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            logger.info(f"Indexed {len(documents)} SQL examples")
+            if await self._index_documents("sql_examples", documents, metadatas, ids):
+                logger.info(f"Indexed {len(documents)} SQL examples")
         except Exception as e:
             logger.error(f"Error indexing SQL examples: {str(e)}")
             raise
     
-    async def search_relevant_context(self, question: str, top_k: int = 5) -> Dict[str, List[Dict[str, Any]]]:
-        """질문과 관련된 컨텍스트 검색"""
+    async def search_relevant_context(
+        self,
+        question: str,
+        top_k: int = 5,
+        top_k_per_collection: Optional[Dict[str, int]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """질문과 관련된 컨텍스트 검색 (top_k_per_collection으로 종류별 결과 수 지정 가능)"""
         try:
-            results = {}
+            limits = {key: (top_k_per_collection or {}).get(key, top_k) for key in _DOC_TYPES}
             
-            # 1. 테이블 스키마 검색
-            table_results = await self.vector_store.search_similar(
-                collection_name="table_schemas",
+            # 한 번의 검색 후 type 메타데이터로 종류별 분류 (거리 순서 유지)
+            search_results = await self.vector_store.search_similar(
+                collection_name=_KNOWLEDGE_BASE,
                 query_text=question,
-                n_results=top_k
+                n_results=sum(limits.values()) * _OVERFETCH_FACTOR,
+                query_embedding=await self.vector_store.embed_query(question)
             )
-            results["table_schemas"] = table_results
             
-            # 2. 비즈니스 용어 검색
-            term_results = await self.vector_store.search_similar(
-                collection_name="business_terms",
-                query_text=question,
-                n_results=top_k
-            )
-            results["business_terms"] = term_results
-            
-            # 3. SQL 예시 검색
-            sql_results = await self.vector_store.search_similar(
-                collection_name="sql_examples",
-                query_text=question,
-                n_results=top_k
-            )
-            results["sql_examples"] = sql_results
+            results = {key: [] for key in _DOC_TYPES}
+            for result in search_results:
+                key = _CONTEXT_KEYS.get((result["metadata"] or {}).get("type"))
+                if key is not None and len(results[key]) < limits[key]:
+                    results[key].append(result)
             
             logger.info(f"Retrieved context for question: {question}")
             return results
@@ -224,10 +240,15 @@ class RAGEngine:
     async def get_collection_stats(self) -> Dict[str, Any]:
         """컬렉션 통계 조회"""
         try:
-            stats = {}
-            for collection_name in ["table_schemas", "business_terms", "sql_examples"]:
-                stats[collection_name] = await self.vector_store.get_collection_stats(collection_name)
-            return stats
+            # 종류별 문서 수를 동시에 조회
+            counts = await asyncio.gather(*(
+                self.vector_store.count_documents(_KNOWLEDGE_BASE, where={"type": doc_type})
+                for doc_type in _DOC_TYPES.values()
+            ))
+            return {
+                key: {"name": key, "count": count, "collection": _KNOWLEDGE_BASE}
+                for key, count in zip(_DOC_TYPES, counts)
+            }
         except Exception as e:
             logger.error(f"Error getting collection stats: {str(e)}")
             raise
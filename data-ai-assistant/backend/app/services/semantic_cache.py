@@ -0,0 +1,143 @@
+import contextlib
+import fcntl
+import json
+import os
+import re
+import time
+from typing import Any, List, Optional, Tuple
+import numpy as np
+
+# 질문 속 숫자와 따옴표 리터럴 (임베딩이 가까워도 값이 다르면 다른 질문으로 취급)
+_LITERAL_RE = re.compile(r"'[^']*'|\"[^\"]*\"|\d+(?:[.,]\d+)*")
+
+
+def _extract_literals(question: str) -> Tuple[str, ...]:
+    """질문에 등장하는 리터럴을 순서대로 추출"""
+    return tuple(_LITERAL_RE.findall(question))
+
+
+@contextlib.contextmanager
+def _file_lock(path: str, exclusive: bool):
+    """여러 워커 프로세스가 같은 캐시 파일을 동시에 읽고 쓰지 않도록 잠금 (닫을 때 해제)"""
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+class SemanticCache:
+    """질문 임베딩 근접도 기반 근사 결과 캐시"""
+    
+    def __init__(self, max_size: int, max_distance: float, ttl: float):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.ttl = ttl
+        
+        # 정규화된 임베딩을 한 행렬에 모아 두고 내적 한 번으로 전체 비교
+        self._matrix: Optional[np.ndarray] = None
+        # 조회마다 새 배열을 만들지 않도록 유사도 결과 버퍼 재사용
+        self._scores = np.empty(max_size, dtype=np.float32)
+        self._results: List[Any] = [None] * max_size
+        # 항목별 원본 질문의 리터럴 ("2023년 매출"과 "2024년 매출"을 구분)
+        self._literals: List[Optional[Tuple[str, ...]]] = [None] * max_size
+        # 생성 시각은 벽시계 기준 (파일로 저장 후 재시작해도 중단된 시간까지 만료에 반영)
+        self._created_at = np.zeros(max_size)
+        self._last_used = np.zeros(max_size)
+        self._size = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """L2 정규화된 float32 벡터로 변환"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def get(self, embedding: List[float], question: str) -> Optional[Any]:
+        """코사인 거리가 임계값 이내이고 리터럴이 같은 가장 가까운 결과 조회"""
+        if self._size == 0:
+            return None
+        
+        scores = np.matmul(self._matrix[:self._size], self._normalize(embedding), out=self._scores[:self._size])
+        candidates = np.flatnonzero(scores >= 1.0 - self.max_distance)
+        if candidates.size == 0:
+            return None
+        
+        literals = _extract_literals(question)
+        now = time.time()
+        for slot in candidates[np.argsort(-scores[candidates])]:
+            if now - self._created_at[slot] > self.ttl:
+                # 만료된 항목은 다음 저장 시 가장 먼저 교체
+                self._last_used[slot] = 0.0
+                continue
+            if self._literals[slot] == literals:
+                self._last_used[slot] = now
+                return self._results[slot]
+        return None
+    
+    def put(self, embedding: List[float], question: str, result: Any):
+        """결과 저장 (가득 찬 경우 가장 오래 사용되지 않은 항목 교체)"""
+        self._insert(self._normalize(embedding), _extract_literals(question), result, time.time())
+    
+    def _insert(self, vector: np.ndarray, literals: Tuple[str, ...], result: Any, created_at: float):
+        """정규화된 벡터와 결과를 빈 슬롯 또는 가장 오래 사용되지 않은 슬롯에 기록"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+        
+        if self._size < self.max_size:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+        
+        self._matrix[slot] = vector
+        self._results[slot] = result
+        self._literals[slot] = literals
+        self._created_at[slot] = created_at
+        self._last_used[slot] = created_at
+    
+    def save(self, path: str):
+        """캐시를 파일로 저장 (path.npz에 벡터, path.json에 결과 - 결과는 JSON 직렬화 가능해야 함)"""
+        # 임시 파일에 쓴 뒤 교체하여 읽는 쪽이 쓰다 만 파일을 보지 않도록 함
+        tmp_suffix = f".{os.getpid()}.tmp"
+        with _file_lock(path, exclusive=True):
+            if self._size == 0:
+                # 비운 캐시가 재시작 시 이전 파일에서 되살아나지 않도록 삭제
+                for suffix in (".npz", ".json"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(f"{path}{suffix}")
+                return
+            
+            with open(f"{path}.npz{tmp_suffix}", "wb") as f:
+                np.savez(f, matrix=self._matrix[:self._size], created_at=self._created_at[:self._size])
+            with open(f"{path}.json{tmp_suffix}", "w", encoding="utf-8") as f:
+                json.dump({
+                    "results": self._results[:self._size],
+                    "literals": self._literals[:self._size]
+                }, f, ensure_ascii=False)
+            os.replace(f"{path}.npz{tmp_suffix}", f"{path}.npz")
+            os.replace(f"{path}.json{tmp_suffix}", f"{path}.json")
+    
+    def load(self, path: str):
+        """저장된 캐시 로드 (현재 시각 기준으로 이미 만료된 항목 제외)"""
+        try:
+            with _file_lock(path, exclusive=False):
+                with np.load(f"{path}.npz") as arrays:
+                    matrix, created_at = arrays["matrix"], arrays["created_at"]
+                with open(f"{path}.json", encoding="utf-8") as f:
+                    payload = json.load(f)
+            results, literals = payload["results"], payload["literals"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        
+        now = time.time()
+        for vector, entry_created_at, entry_literals, result in zip(matrix, created_at, literals, results):
+            if now - entry_created_at < self.ttl:
+                self._insert(vector.astype(np.float32), tuple(entry_literals), result, float(entry_created_at))
+    
+    def clear(self):
+        """캐시 초기화"""
+        self._matrix = None
+        self._results = [None] * self.max_size
+        self._literals = [None] * self.max_size
+        self._created_at[:] = 0.0
+        self._last_used[:] = 0.0
+        self._size = 0
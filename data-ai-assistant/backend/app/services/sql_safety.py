@@ -0,0 +1,54 @@
+from functools import lru_cache
+from typing import Optional
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+import sqlglot
+
+# 쿼리 트리 어디에도 포함되면 안 되는 노드 (파싱되지 않는 GRANT, TRUNCATE 등은 Command)
+_FORBIDDEN_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge,
+    exp.Drop, exp.Create, exp.AlterTable, exp.Command,
+    exp.Into  # SELECT ... INTO는 새 테이블을 생성
+)
+
+
+@lru_cache(maxsize=512)
+def parse_select(sql_query: str) -> Optional[exp.Expression]:
+    """단일 SELECT 문이면 구문 트리 반환 (안전하지 않거나 파싱할 수 없으면 None, 공유 트리이므로 수정 금지)"""
+    try:
+        statements = [stmt for stmt in sqlglot.parse(sql_query.strip(), read="postgres") if stmt is not None]
+    except SqlglotError:
+        return None
+    
+    # 단일 SELECT (WITH, UNION 포함) 문만 허용
+    if len(statements) != 1 or not isinstance(statements[0], (exp.Select, exp.Union)):
+        return None
+    
+    tree = statements[0]
+    if tree.find(*_FORBIDDEN_NODES) is not None:
+        return None
+    return tree
+
+
+def is_safe_select(sql_query: str) -> bool:
+    """읽기 전용 단일 SELECT 문인지 검사"""
+    return parse_select(sql_query) is not None
+
+
+def has_limit(sql_query: str) -> bool:
+    """최상위 쿼리에 LIMIT이 있는지 검사 (안전한 SELECT 문 기준)"""
+    tree = parse_select(sql_query)
+    return tree is not None and bool(tree.args.get("limit"))
+
+
+@lru_cache(maxsize=512)
+def prepare_select(sql_query: str, limit: int) -> Optional[str]:
+    """안전성 검사 후 LIMIT이 없으면 추가한 쿼리 반환 (안전하지 않으면 None)"""
+    tree = parse_select(sql_query)
+    if tree is None:
+        return None
+    
+    # limit()은 복사본을 반환하므로 캐시된 트리는 변경되지 않음
+    if not tree.args.get("limit"):
+        tree = tree.limit(limit)
+    return tree.sql(dialect="postgres")
@@ -1,41 +1,113 @@
-import openai
+import asyncio
+import contextlib
+import os
+from decimal import Decimal
 from typing import Dict, Any, List, Optional
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from app.core.config import settings
+from app.core.database import sync_engine
+from app.core.shutdown import register_shutdown_hook
 from app.services.rag_engine import rag_engine
+from app.services.embedding import embedding_service
+from app.services.llm_client import async_openai_client
+from app.services.semantic_cache import SemanticCache
+from app.services.sql_safety import is_safe_select, prepare_select
 import logging
 import json
 import re
 
 logger = logging.getLogger(__name__)
 
+# 응답 파싱용 정규식 (호출마다 다시 컴파일하지 않도록 모듈 로드 시 한 번만 컴파일)
+_SQL_BLOCK_RE = re.compile(r'```sql\n(.*?)\n```', re.DOTALL)
+_TABLE_RE = re.compile(r'(?:FROM|JOIN)\s+([A-Za-z_][\w\.]*)', re.IGNORECASE)
+
+# JSON 응답 모드(response_format)를 지원하는 모델 접두사
+_JSON_MODE_MODELS = ("gpt-4o", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-3.5-turbo-1106", "gpt-3.5-turbo-0125")
+
+_json_decoder = json.JSONDecoder()
+
+# 프롬프트에 넣을 컬렉션별 검색 결과 수 (사용하지 않을 결과는 검색하지 않음)
+_CONTEXT_LIMITS = {"table_schemas": 2, "business_terms": 3, "sql_examples": 2}
+
 
 class TextToSQLEngine:
     """Text-to-SQL 변환 엔진"""
     
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.engine = create_engine(settings.DATABASE_URL)
+        # 공유 비동기 클라이언트 (이벤트 루프를 막지 않고 커넥션 재사용)
+        self.client = async_openai_client
+        self.engine = sync_engine
         self.rag_engine = rag_engine
+        
+        # 유사 질문 SQL 캐시 (적중 시 RAG 검색과 GPT-4 호출 생략)
+        self.sql_cache = SemanticCache(
+            max_size=settings.SQL_CACHE_SIZE,
+            max_distance=settings.SQL_CACHE_MAX_DISTANCE,
+            ttl=settings.SQL_CACHE_TTL
+        )
+        self.sql_cache.load(settings.SQL_CACHE_PATH)
+    
+    def save_cache(self):
+        """SQL 캐시를 디스크에 저장 (재시작 후 복원용)"""
+        try:
+            os.makedirs(os.path.dirname(settings.SQL_CACHE_PATH) or ".", exist_ok=True)
+            self.sql_cache.save(settings.SQL_CACHE_PATH)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Error saving SQL cache: {str(e)}")
+    
+    def clear_cache(self):
+        """SQL 캐시 초기화 (스키마 변경 후 호출, 저장된 파일도 삭제)"""
+        self.sql_cache.clear()
+        self.save_cache()
+    
+    async def _embed_question(self, question: str) -> Optional[List[float]]:
+        """캐시 조회용 질문 임베딩 (실패 시 캐시 없이 진행)"""
+        try:
+            return await embedding_service.embed_text(question)
+        except Exception as e:
+            logger.warning(f"SQL cache lookup failed: {str(e)}")
+            return None
     
     async def generate_sql(self, question: str, user_context: Optional[str] = None) -> Dict[str, Any]:
         """자연어 질문을 SQL로 변환"""
         try:
-            # 1. RAG를 통해 관련 컨텍스트 검색
-            context = await self.rag_engine.search_relevant_context(question, top_k=3)
+            # 1. RAG 컨텍스트 검색을 먼저 시작하고 그동안 유사 질문 캐시 조회
+            context_task = asyncio.create_task(self.rag_engine.search_relevant_context(
+                question, top_k_per_collection=_CONTEXT_LIMITS
+            ))
+            try:
+                # 추가 컨텍스트가 있는 질문은 결과가 달라지므로 캐시 제외
+                question_embedding = None if user_context else await self._embed_question(question)
+                if question_embedding is not None:
+                    cached = self.sql_cache.get(question_embedding, question)
+                    if cached is not None:
+                        return dict(cached)
+                
+                context = await context_task
+            finally:
+                # 캐시 적중이나 오류로 먼저 빠져나와도 진행 중인 검색을 취소하고 종료까지 대기
+                context_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await context_task
             
             # 2. 프롬프트 생성
             prompt = await self._build_prompt(question, context, user_context)
             
-            # 3. OpenAI API 호출
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            # 3. OpenAI API 호출 (지원 모델은 JSON 모드로 파싱 가능한 응답 보장)
+            extra_options = {}
+            if settings.SQL_MODEL.startswith(_JSON_MODE_MODELS):
+                extra_options["response_format"] = {"type": "json_object"}
+            
+            response = await self.client.chat.completions.create(
+                model=settings.SQL_MODEL,
                 messages=[
                     {"role": "system", "content": self._get_system_prompt()},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,
-                max_tokens=1000
+                max_tokens=1000,
+                **extra_options
             )
             
             # 4. 응답 파싱
@@ -45,6 +117,9 @@ class TextToSQLEngine:
             if result.get("sql_query"):
                 validation_result = await self._validate_sql(result["sql_query"])
                 result.update(validation_result)
+                
+                if result.get("is_valid") and question_embedding is not None:
+                    self.sql_cache.put(question_embedding, question, dict(result))
             
             return result
         except Exception as e:
@@ -78,43 +153,50 @@ class TextToSQLEngine:
     
     async def _build_prompt(self, question: str, context: Dict[str, Any], user_context: Optional[str] = None) -> str:
         """프롬프트 생성"""
-        prompt = f"질문: {question}\n\n"
+        # 조각을 모아 마지막에 한 번만 연결
+        parts = [f"질문: {question}\n\n"]
         
         # 테이블 스키마 정보 추가
-        if context.get("table_schemas"):
-            prompt += "사용 가능한 테이블 정보:\n"
-            for schema in context["table_schemas"][:2]:  # 상위 2개만 사용
-                prompt += f"{schema['document']}\n\n"
+        schemas = context.get("table_schemas", [])[:_CONTEXT_LIMITS["table_schemas"]]
+        if schemas:
+            parts.append("사용 가능한 테이블 정보:\n")
+            parts.extend(f"{schema['document']}\n\n" for schema in schemas)
         
         # 비즈니스 용어 정보 추가
-        if context.get("business_terms"):
-            prompt += "관련 비즈니스 용어:\n"
-            for term in context["business_terms"][:3]:  # 상위 3개만 사용
-                prompt += f"{term['document']}\n"
+        terms = context.get("business_terms", [])[:_CONTEXT_LIMITS["business_terms"]]
+        if terms:
+            parts.append("관련 비즈니스 용어:\n")
+            parts.extend(f"{term['document']}\n" for term in terms)
         
         # SQL 예시 추가
-        if context.get("sql_examples"):
-            prompt += "\n참고할 만한 SQL 예시:\n"
-            for example in context["sql_examples"][:2]:  # 상위 2개만 사용
-                prompt += f"{example['document']}\n\n"
+        examples = context.get("sql_examples", [])[:_CONTEXT_LIMITS["sql_examples"]]
+        if examples:
+            parts.append("\n참고할 만한 SQL 예시:\n")
+            parts.extend(f"{example['document']}\n\n" for example in examples)
         
         # 사용자 컨텍스트 추가
         if user_context:
-            prompt += f"\n추가 컨텍스트: {user_context}\n"
+            parts.append(f"\n추가 컨텍스트: {user_context}\n")
         
-        prompt += "\n위 정보를 바탕으로 질문에 대한 SQL 쿼리를 생성해주세요."
+        parts.append("\n위 정보를 바탕으로 질문에 대한 SQL 쿼리를 생성해주세요.")
         
-        return prompt
+        return "".join(parts)
     
     def _parse_response(self, response_text: str) -> Dict[str, Any]:
         """응답 파싱"""
         try:
-            # JSON 응답 파싱 시도
-            if response_text.strip().startswith('{'):
-                return json.loads(response_text)
+            # JSON 응답 파싱 시도 (설명 문장에 감싸인 경우 첫 JSON 객체만 해석)
+            json_start = response_text.find('{')
+            if json_start != -1:
+                try:
+                    parsed, _ = _json_decoder.raw_decode(response_text, json_start)
+                    if isinstance(parsed, dict):
+                        return parsed
+                except ValueError:
+                    pass
             
             # JSON이 아닌 경우 SQL 추출 시도
-            sql_match = re.search(r'```sql\n(.*?)\n```', response_text, re.DOTALL)
+            sql_match = _SQL_BLOCK_RE.search(response_text)
             if sql_match:
                 sql_query = sql_match.group(1).strip()
                 return {
@@ -143,10 +225,8 @@ class TextToSQLEngine:
     def _extract_tables_from_sql(self, sql_query: str) -> List[str]:
         """SQL에서 테이블명 추출"""
         try:
-            # 간단한 정규식으로 테이블명 추출
-            tables = re.findall(r'FROM\s+(\w+)', sql_query, re.IGNORECASE)
-            tables += re.findall(r'JOIN\s+(\w+)', sql_query, re.IGNORECASE)
-            return list(set(tables))
+            # FROM/JOIN 뒤의 테이블명을 한 번의 검색으로 추출
+            return list(set(_TABLE_RE.findall(sql_query)))
         except Exception:
             return []
     
@@ -160,9 +240,11 @@ class TextToSQLEngine:
                     "error": "안전하지 않은 쿼리입니다."
                 }
             
-            # 2. 구문 검사 (EXPLAIN으로 테스트)
+            # 2. 구문 검사 (읽기 전용 트랜잭션에서 EXPLAIN 후 롤백, 풀 커넥션 재사용)
             with self.engine.connect() as conn:
-                conn.execute(text(f"EXPLAIN {sql_query}"))
+                conn.execute(text("SET TRANSACTION READ ONLY"))
+                conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}"))
+                conn.rollback()
             
             return {
                 "is_valid": True,
@@ -176,50 +258,28 @@ class TextToSQLEngine:
     
     def _is_safe_query(self, sql_query: str) -> bool:
         """쿼리 안전성 검사"""
-        sql_lower = sql_query.lower().strip()
-        
-        # 금지된 키워드 검사
-        forbidden_keywords = [
-            'insert', 'update', 'delete', 'drop', 'create', 'alter',
-            'truncate', 'grant', 'revoke', 'exec', 'execute'
-        ]
-        
-        for keyword in forbidden_keywords:
-            if keyword in sql_lower:
-                return False
-        
-        # SELECT로 시작하는지 확인
-        if not sql_lower.startswith('select'):
-            return False
-        
-        return True
+        return is_safe_select(sql_query)
     
     async def execute_sql(self, sql_query: str, limit: int = 100) -> Dict[str, Any]:
         """SQL 실행"""
         try:
-            # 안전성 검사
-            if not self._is_safe_query(sql_query):
+            # 안전성 검사와 LIMIT 추가를 한 번의 파싱으로 처리 (안전하지 않으면 None)
+            sql_query = prepare_select(sql_query, limit)
+            if sql_query is None:
                 return {
                     "success": False,
                     "error": "안전하지 않은 쿼리입니다.",
                     "data": None
                 }
             
-            # LIMIT 추가 (안전장치)
-            if 'limit' not in sql_query.lower():
-                sql_query = f"{sql_query.rstrip(';')} LIMIT {limit};"
-            
-            # 쿼리 실행
+            # 쿼리 실행 (쿼리에 더 큰 LIMIT이 있어도 최대 limit 행만 가져옴)
             with self.engine.connect() as conn:
                 result = conn.execute(text(sql_query))
                 columns = list(result.keys())
-                rows = result.fetchall()
-                
-                # 결과 포맷팅
+                # NUMERIC 컬럼(price, total_amount 등)은 JSON 응답에서 문자열이 되지 않도록 float로 변환
                 data = [
-                    {col: str(row[i]) if row[i] is not None else None 
-                     for i, col in enumerate(columns)}
-                    for row in rows
+                    {col: float(value) if isinstance(value, Decimal) else value for col, value in row.items()}
+                    for row in result.mappings().fetchmany(limit)
                 ]
                 
                 return {
@@ -289,5 +349,6 @@ class TextToSQLEngine:
             }
 
 
-# 전역 Text-to-SQL 엔진 인스턴스
-text_to_sql_engine = TextToSQLEngine()
\ No newline at end of file
+# 전역 Text-to-SQL 엔진 인스턴스 (종료 시 SQL 캐시 저장)
+text_to_sql_engine = TextToSQLEngine()
+register_shutdown_hook(text_to_sql_engine.save_cache)
\ No newline at end of file
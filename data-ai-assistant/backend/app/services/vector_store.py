@@ -1,11 +1,17 @@
+import asyncio
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
 from typing import List, Dict, Any, Optional
 from app.core.config import settings
+from app.services.micro_batcher import MicroBatcher
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 한 번에 임베딩할 최대 문서 수
+_EMBED_BATCH_SIZE = 256
+
 
 class VectorStore:
     """벡터 데이터베이스 관리 클래스"""
@@ -18,46 +24,73 @@ class VectorStore:
                 allow_reset=True
             )
         )
+        # 컬렉션 생성 시 사용한 기본 임베딩 함수 (질의 임베딩을 한 번만 계산해 재사용)
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        
+        # 동시에 들어온 질의 임베딩 요청을 모아 한 번의 모델 실행으로 처리
+        self._query_batcher = MicroBatcher(
+            self._embed_documents,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_batch_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000,
+            name="batched query embeddings"
+        )
+        
         self._initialize_collections()
     
     def _initialize_collections(self):
         """컬렉션 초기화"""
+        # 스키마, 용어, SQL 예시를 type 메타데이터로 구분하여 하나의 컬렉션에 저장 (검색 1회)
         self.collections = {
-            "table_schemas": self._get_or_create_collection(
-                "table_schemas",
-                metadata={"description": "Database table schemas and metadata"}
-            ),
-            "business_terms": self._get_or_create_collection(
-                "business_terms",
-                metadata={"description": "Business terminology and definitions"}
-            ),
-            "sql_examples": self._get_or_create_collection(
-                "sql_examples",
-                metadata={"description": "SQL query examples and patterns"}
+            "knowledge_base": self._get_or_create_collection(
+                "knowledge_base",
+                metadata={"description": "Table schemas, business terms and SQL examples"}
             )
         }
     
     def _get_or_create_collection(self, name: str, metadata: Dict[str, Any] = None):
-        """컬렉션 생성 또는 조회"""
-        try:
-            return self.client.get_collection(name)
-        except Exception:
-            return self.client.create_collection(
-                name=name,
-                metadata=metadata or {}
-            )
+        """컬렉션 생성 또는 조회 (기존 메타데이터는 유지하고 없는 키만 추가)"""
+        # metadata를 넘기면 Chroma가 기존 메타데이터(content_hash 등)를 통째로 덮어쓰므로 조회만 수행
+        collection = self.client.get_or_create_collection(
+            name=name,
+            embedding_function=self.embedding_function
+        )
+        current = collection.metadata or {}
+        missing = {key: value for key, value in (metadata or {}).items() if key not in current}
+        if missing:
+            collection.modify(metadata={**current, **missing})
+        return collection
+    
+    def _embed_documents_sync(self, documents: List[str]) -> List[List[float]]:
+        """문서 임베딩을 묶음 단위로 계산"""
+        embeddings = []
+        for start in range(0, len(documents), _EMBED_BATCH_SIZE):
+            embeddings.extend(self.embedding_function(documents[start:start + _EMBED_BATCH_SIZE]))
+        return [list(embedding) for embedding in embeddings]
+    
+    async def _embed_documents(self, documents: List[str]) -> List[List[float]]:
+        """문서 임베딩 계산 (모델 실행은 스레드에서)"""
+        return await asyncio.to_thread(self._embed_documents_sync, documents)
+    
+    async def embed_query(self, query_text: str) -> List[float]:
+        """검색 질의 임베딩 계산 (여러 컬렉션 검색에 공유)"""
+        return await self._query_batcher.submit(query_text)
     
     async def add_documents(
         self,
         collection_name: str,
         documents: List[str],
         metadatas: List[Dict[str, Any]],
-        ids: List[str]
+        ids: List[str],
+        embeddings: Optional[List[List[float]]] = None
     ):
-        """문서 추가"""
+        """문서 추가 (임베딩이 없으면 한 번에 묶어서 계산)"""
         try:
             collection = self.collections[collection_name]
-            collection.add(
+            if embeddings is None:
+                embeddings = await self._embed_documents(documents)
+            await asyncio.to_thread(
+                collection.add,
+                embeddings=embeddings,
                 documents=documents,
                 metadatas=metadatas,
                 ids=ids
@@ -67,33 +100,85 @@ class VectorStore:
             logger.error(f"Error adding documents to {collection_name}: {str(e)}")
             raise
     
-    async def search_similar(
+    def _search_sync(
         self,
         collection_name: str,
         query_text: str,
-        n_results: int = 5,
-        where: Optional[Dict[str, Any]] = None
+        n_results: int,
+        where: Optional[Dict[str, Any]],
+        query_embedding: Optional[List[float]]
     ) -> List[Dict[str, Any]]:
-        """유사 문서 검색"""
-        try:
-            collection = self.collections[collection_name]
+        """유사 문서 검색 (동기 Chroma 호출)"""
+        collection = self.collections[collection_name]
+        if query_embedding is not None:
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=where
+            )
+        else:
             results = collection.query(
                 query_texts=[query_text],
                 n_results=n_results,
                 where=where
             )
+        
+        # 결과 포맷팅
+        formatted_results = []
+        for i in range(len(results['documents'][0])):
+            formatted_results.append({
+                'document': results['documents'][0][i],
+                'metadata': results['metadatas'][0][i],
+                'distance': results['distances'][0][i] if 'distances' in results else None,
+                'id': results['ids'][0][i]
+            })
+        
+        return formatted_results
+    
+    def get_content_hash(self, collection_name: str, hash_key: str = "content_hash") -> Optional[str]:
+        """컬렉션에 마지막으로 색인한 문서 내용 해시 조회"""
+        return (self.collections[collection_name].metadata or {}).get(hash_key)
+    
+    async def replace_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str],
+        content_hash: str,
+        where: Optional[Dict[str, Any]] = None,
+        hash_key: str = "content_hash"
+    ):
+        """컬렉션 문서(where 지정 시 조건에 맞는 문서만)를 교체하고 내용 해시 기록"""
+        try:
+            collection = self.collections[collection_name]
+            existing_ids = (await asyncio.to_thread(collection.get, where=where, include=[]))["ids"]
+            if existing_ids:
+                await asyncio.to_thread(collection.delete, ids=existing_ids)
             
-            # 결과 포맷팅
-            formatted_results = []
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else None,
-                    'id': results['ids'][0][i]
-                })
-            
-            return formatted_results
+            await self.add_documents(collection_name, documents, metadatas, ids)
+            await asyncio.to_thread(
+                collection.modify,
+                metadata={**(collection.metadata or {}), hash_key: content_hash}
+            )
+        except Exception as e:
+            logger.error(f"Error replacing documents in {collection_name}: {str(e)}")
+            raise
+    
+    async def search_similar(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """유사 문서 검색 (query_embedding이 있으면 질의 임베딩 계산 생략)"""
+        try:
+            # 동기 Chroma 호출은 스레드에서 실행하여 여러 컬렉션 검색을 동시에 진행
+            return await asyncio.to_thread(
+                self._search_sync, collection_name, query_text, n_results, where, query_embedding
+            )
         except Exception as e:
             logger.error(f"Error searching in {collection_name}: {str(e)}")
             raise
@@ -128,6 +213,13 @@ class VectorStore:
             logger.error(f"Error deleting document {document_id}: {str(e)}")
             raise
     
+    async def count_documents(self, collection_name: str, where: Optional[Dict[str, Any]] = None) -> int:
+        """조건에 맞는 문서 수 조회"""
+        collection = self.collections[collection_name]
+        if where is None:
+            return await asyncio.to_thread(collection.count)
+        return len((await asyncio.to_thread(collection.get, where=where, include=[]))["ids"])
+    
     async def get_collection_stats(self, collection_name: str) -> Dict[str, Any]:
         """컬렉션 통계 조회"""
         try:
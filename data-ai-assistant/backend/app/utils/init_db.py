@@ -16,7 +16,8 @@ async def create_tables():
     """테이블 생성"""
     try:
         # 테이블 생성
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Tables created successfully")
         
         # 샘플 데이터 생성
@@ -28,5 +29,25 @@ async def create_tables():
         raise
 
 
+
+async def initialize_knowledge_base():
+    """RAG 지식 베이스 색인 (API 요청 경로 대신 배포 시 한 번 실행)"""
+    # 벡터 스토어와 임베딩 모델은 색인할 때만 로딩
+    from app.services.rag_engine import rag_engine
+    
+    try:
+        await rag_engine.initialize_knowledge_base()
+        logger.info("Knowledge base indexed successfully")
+    except Exception as e:
+        logger.error(f"Error indexing knowledge base: {str(e)}")
+        raise
+
+
+async def main():
+    """데이터베이스와 지식 베이스 초기화"""
+    await create_tables()
+    await initialize_knowledge_base()
+
+
 if __name__ == "__main__":
-    asyncio.run(create_tables())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -241,6 +241,11 @@ const ChatPage: React.FC = () => {
                         <ListItem key={index}>
                           <Typography variant="body2">
                             <strong>{step.step}:</strong> {step.result}
+                            {step.elapsed !== undefined && (
+                              <span style={{ opacity: 0.7, fontSize: '0.8em' }}>
+                                {' '}({step.elapsed.toFixed(3)}s)
+                              </span>
+                            )}
                             {step.timestamp && (
                               <span style={{ opacity: 0.7, fontSize: '0.8em' }}>
                                 {' '}({new Date(step.timestamp).toLocaleTimeString()})